@@ -7,6 +7,11 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import pickle
+from data_preprocessing import read_excel_cached, upgrade_label_encoders, build_sparse_features, FusedPreprocessor
+from artifact_store import ArtifactStore
+from compact_ensemble import CompactEnsemble, compact_path
+from model_evaluation import EVALUATION_DATA_PATH, load_evaluation_data
+from model_selection import SELECTION_POLICY_PATH, load_best_model_pointer, load_policy, model_path, pareto_front
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -672,7 +677,7 @@ st.markdown("""
 def load_data():
     """Load the original dataset"""
     try:
-        df = pd.read_excel('Spotify_data.xlsx')
+        df = read_excel_cached('Spotify_data.xlsx')
         return df
     except FileNotFoundError:
         return None
@@ -680,11 +685,72 @@ def load_data():
         st.error(f"Error loading dataset: {str(e)}")
         return None
 
+def resolve_deployment():
+    """
+    Read the artifact store's "best" ref: (release_id, manifest, model_name),
+    or None without a store. main() reads it once per script run, so
+    promotions and rollbacks apply on the next interaction, and passes it to
+    every loader: model, preprocessor and reports all come from one release.
+    """
+    return ArtifactStore().resolve('best')
+
+def deployment_file(name, default_path, deployment):
+    """Path of an artifact of the deployed release, else the working copy at default_path"""
+    if deployment is not None and name in deployment[1]['artifacts']:
+        return ArtifactStore().object_path(deployment[1]['artifacts'][name])
+    return default_path
+
+def select_deployed_model(deployment):
+    """
+    Name of the deployed model: the release's, else the working copies'
+    best_model.json pointer, else the selection policy applied to the results
+    summary (None if none of these exist)
+    """
+    if deployment is not None:
+        return deployment[2]
+    pointer = load_best_model_pointer()
+    if pointer is not None:
+        return pointer
+    try:
+        results_df = pd.read_csv('model_results_summary.csv', index_col=0)
+    except FileNotFoundError:
+        return None
+    return load_policy().select(results_df)
+
 @st.cache_resource
-def load_model():
-    """Load the trained model"""
+def load_model(release=None, model_name=None):
+    """
+    Load a release's model, cached per (release, model), so a promotion or
+    rollback swaps the served model without a restart (with release=None,
+    the churn_model_* working copy named by select_deployed_model). Tree
+    ensembles are served from their compact export, memory-mapped read-only
+    and shared by every app process.
+    """
+    import os
+    
+    if release is not None:
+        try:
+            manifest = ArtifactStore().get_release(release)
+            if f'compact:{model_name}' in manifest['artifacts']:
+                return CompactEnsemble.load(ArtifactStore().object_path(manifest['artifacts'][f'compact:{model_name}']))
+            return ArtifactStore().load_object(manifest['artifacts'][f'model:{model_name}'])
+        except Exception as e:
+            st.error(f"Error loading model: {str(e)}")
+            return None
+    
     try:
-        with open('best_churn_model.pkl', 'rb') as f:
+        deployed = select_deployed_model(None)
+    except ValueError as e:
+        st.warning(f"Selection policy could not pick a model ({str(e)})")
+        return None
+    if deployed is None:
+        return None
+    model_file = compact_path(deployed) if os.path.exists(compact_path(deployed)) else model_path(deployed)
+    
+    try:
+        if model_file.endswith('.npz'):
+            return CompactEnsemble.load(model_file)
+        with open(model_file, 'rb') as f:
             model = pickle.load(f)
         return model
     except FileNotFoundError:
@@ -694,11 +760,19 @@ def load_model():
         return None
 
 @st.cache_resource
-def load_preprocessor():
-    """Load the preprocessor"""
+def load_preprocessor(release=None):
+    """Load a release's preprocessor, cached per release (the working copy if release is None)"""
     try:
-        with open('preprocessor.pkl', 'rb') as f:
+        deployment = (release, ArtifactStore().get_release(release), None) if release is not None else None
+        with open(deployment_file('preprocessor', 'preprocessor.pkl', deployment), 'rb') as f:
             preprocessor = pickle.load(f)
+        preprocessor['label_encoders'] = upgrade_label_encoders(preprocessor['label_encoders'])
+        # Older artifacts lack the fused lookup table; build it once here
+        if preprocessor.get('fused') is None and not preprocessor.get('multi_hot_encoders'):
+            preprocessor['fused'] = FusedPreprocessor(
+                preprocessor['feature_names'], preprocessor['label_encoders'], preprocessor['scaler'],
+                preprocessor.get('selected_features')
+            )
         return preprocessor
     except FileNotFoundError:
         return None
@@ -707,14 +781,27 @@ def load_preprocessor():
         return None
 
 def preprocess_user_input(user_input, preprocessor, feature_names):
-    """Preprocess user input for prediction"""
-    from sklearn.preprocessing import LabelEncoder
+    """Preprocess user input for prediction (only the selected features if the feature set was pruned)"""
     import numpy as np
     
+    selected = preprocessor.get('selected_features')
     try:
+        # Fast path: build the scaled row by pure lookups
+        if preprocessor.get('fused') is not None:
+            return preprocessor['fused'].transform_record(user_input)
+        
         # Create a DataFrame from user input
         df_input = pd.DataFrame([user_input])
         
+        # Multi-hot preprocessors produce a sparse token row
+        if preprocessor.get('multi_hot_encoders'):
+            X_sparse = build_sparse_features(
+                df_input, preprocessor['label_encoders'],
+                preprocessor['multi_hot_encoders'], preprocessor['source_columns']
+            )
+            X_scaled = preprocessor['scaler'].transform(X_sparse)
+            return X_scaled[:, [feature_names.index(col) for col in selected]] if selected else X_scaled
+        
         # Create a new DataFrame with all features initialized to 0
         processed_input = pd.DataFrame(0, index=[0], columns=feature_names)
         
@@ -722,19 +809,8 @@ def preprocess_user_input(user_input, preprocessor, feature_names):
         for col in df_input.columns:
             if col in feature_names:
                 if col in preprocessor['label_encoders']:
-                    # Categorical feature - encode it
-                    le = preprocessor['label_encoders'][col]
-                    input_value = str(df_input[col].iloc[0])
-                    le_classes_str = [str(c) for c in le.classes_]
-                    
-                    # Handle unseen categories
-                    if input_value in le_classes_str:
-                        # Find the original class value
-                        original_value = le.classes_[le_classes_str.index(input_value)]
-                        processed_input[col] = le.transform([original_value])[0]
-                    else:
-                        # Use first class (most common) as default
-                        processed_input[col] = le.transform([le.classes_[0]])[0]
+                    # Categorical feature - O(1) lookup; unseen categories map to the first class
+                    processed_input[col] = preprocessor['label_encoders'][col].encode(df_input[col].iloc[0])
                 else:
                     # Numeric feature - convert to numeric
                     try:
@@ -755,6 +831,8 @@ def preprocess_user_input(user_input, preprocessor, feature_names):
         
         # Scale features
         df_input_scaled = preprocessor['scaler'].transform(processed_input)
+        if selected:
+            df_input_scaled = df_input_scaled[:, [feature_names.index(col) for col in selected]]
         
         return df_input_scaled
     
@@ -764,7 +842,7 @@ def preprocess_user_input(user_input, preprocessor, feature_names):
         print(f"Preprocessing error: {str(e)}")
         print(traceback.format_exc())
         # Return zeros if preprocessing fails
-        return np.zeros((1, len(feature_names)))
+        return np.zeros((1, len(selected or feature_names)))
 
 def create_navbar():
     """Create navigation bar in header"""
@@ -968,8 +1046,11 @@ def main():
     
     # Load data and models
     df = load_data()
-    model = load_model()
-    preprocessor = load_preprocessor()
+    # One read of the "best" ref per run; the loaders are cached per release
+    deployment = resolve_deployment()
+    release, _, model_name = deployment if deployment is not None else (None, None, None)
+    model = load_model(release, model_name)
+    preprocessor = load_preprocessor(release)
     
     # Display content based on selected page from header navigation
     if st.session_state.nav_page == "Home":
@@ -989,7 +1070,7 @@ def main():
             show_analytics_dashboard(df)
     
     elif st.session_state.nav_page == "Model Performance":
-        show_model_performance()
+        show_model_performance(deployment)
     
     # Add professional footer to all pages
     create_footer()
@@ -1365,9 +1446,10 @@ def show_prediction_page(model, preprocessor, df):
                 
                 X_input = preprocess_user_input(user_input, preprocessor, feature_names)
                 
-                # Validate input shape
-                if X_input.shape[1] != len(feature_names):
-                    st.error(f"Feature mismatch: Expected {len(feature_names)} features, got {X_input.shape[1]}")
+                # Validate input shape (models take the selected features when the feature set was pruned)
+                n_inputs = len(preprocessor.get('selected_features') or feature_names)
+                if X_input.shape[1] != n_inputs:
+                    st.error(f"Feature mismatch: Expected {n_inputs} features, got {X_input.shape[1]}")
                     return
                 
                 # Make prediction
@@ -1545,17 +1627,24 @@ def show_analytics_dashboard(df):
             except Exception as e:
                 st.warning(f"Could not display music genre chart: {str(e)}")
 
-def show_model_performance():
-    """Display model performance metrics"""
+def show_model_performance(deployment):
+    """Display model performance metrics of the deployed release"""
     st.markdown('<div class="sub-header">📊 Model Performance Metrics</div>', unsafe_allow_html=True)
     
     try:
         # Load results summary
-        results_df = pd.read_csv('model_results_summary.csv', index_col=0)
+        results_df = pd.read_csv(deployment_file('results_summary', 'model_results_summary.csv', deployment), index_col=0)
         
         # Display dataframe without styling to avoid matplotlib version conflicts
         st.dataframe(results_df, use_container_width=True)
         
+        # Model deployed under the saved selection policy
+        try:
+            st.info(f"Deployed model: **{select_deployed_model(deployment)}** "
+                    f"(policy: {load_policy(deployment_file('selection_policy', SELECTION_POLICY_PATH, deployment)).describe()})")
+        except ValueError as e:
+            st.warning(f"Selection policy could not pick a model: {str(e)}")
+        
         # Format the dataframe for better display
         st.markdown("### 📊 Metrics Breakdown")
         for model_name in results_df.index:
@@ -1572,6 +1661,23 @@ def show_model_performance():
                     st.metric("F1-Score", f"{metrics['f1_score']:.4f}")
                 with col5:
                     st.metric("ROC-AUC", f"{metrics['roc_auc']:.4f}")
+                
+                # Training and serving cost (recorded by model_training.py)
+                if 'predict_p99_ms' in metrics.index:
+                    col1, col2, col3, col4, col5 = st.columns(5)
+                    with col1:
+                        st.metric("Fit Time", f"{metrics['fit_time_s']:.2f}s",
+                                  help=f"CPU time: {metrics['fit_cpu_s']:.2f}s")
+                    with col2:
+                        st.metric("Peak RSS", f"{metrics['peak_rss_mb']:.0f} MB",
+                                  help="Growth of resident memory during the fit")
+                    with col3:
+                        st.metric("Latency p50 / p99", f"{metrics['predict_p50_ms']:.2f} / {metrics['predict_p99_ms']:.2f} ms",
+                                  help="Single-row predict_proba latency")
+                    with col4:
+                        st.metric("Throughput", f"{metrics['throughput_rows_s']:,.0f} rows/s")
+                    with col5:
+                        st.metric("Model Size", f"{metrics['model_size_kb']:.1f} KB")
         
         # Visualizations
         col1, col2 = st.columns(2)
@@ -1598,27 +1704,83 @@ def show_model_performance():
             except Exception as e:
                 st.warning(f"Could not display F1-score chart: {str(e)}")
         
-        # Show images if available
+        # Quality vs. serving cost
+        if 'predict_p99_ms' in results_df.columns:
+            try:
+                front = pareto_front(results_df)
+                pareto = ['Pareto-optimal' if name in front else 'Dominated' for name in results_df.index]
+                fig = px.scatter(results_df, x='predict_p99_ms', y='f1_score', text=results_df.index,
+                                 size='model_size_kb', size_max=40, color=pareto,
+                                 title="F1-Score vs. p99 Single-Row Latency",
+                                 labels={'predict_p99_ms': 'p99 Latency (ms)', 'f1_score': 'F1-Score'})
+                fig.update_traces(textposition='top center')
+                st.plotly_chart(fig, use_container_width=True)
+            except Exception as e:
+                st.warning(f"Could not display cost chart: {str(e)}")
+        
+        # Interactive plots drawn from the curve data saved by model_training.py
         try:
+            feature_names, curves = load_evaluation_data(deployment_file('evaluation', EVALUATION_DATA_PATH, deployment))
+        except FileNotFoundError:
+            curves = None
+            st.info("Evaluation data (model_evaluation.npz) not found. Run model_training.py to generate it.")
+        
+        if curves:
             st.markdown("### 📈 Detailed Performance Visualizations")
+            
+            comparison = results_df[['accuracy', 'precision', 'recall', 'f1_score', 'roc_auc']].reset_index(names='model')
+            comparison = comparison.melt(id_vars='model', var_name='metric', value_name='score')
+            fig = px.bar(comparison, x='metric', y='score', color='model', barmode='group',
+                         title="Model Comparison", range_y=[0, 1],
+                         labels={'metric': 'Metric', 'score': 'Score', 'model': 'Model'})
+            st.plotly_chart(fig, use_container_width=True)
+            
             col1, col2 = st.columns(2)
             with col1:
-                try:
-                    st.image('model_comparison.png', caption='Model Comparison')
-                except FileNotFoundError:
-                    st.info("Model comparison image not found.")
+                fig = go.Figure()
+                for model_name, data in curves.items():
+                    auc = results_df.loc[model_name, 'roc_auc'] if model_name in results_df.index else float('nan')
+                    fig.add_trace(go.Scatter(x=data['roc_fpr'], y=data['roc_tpr'], mode='lines',
+                                             name=f'{model_name} (AUC = {auc:.3f})'))
+                fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines', name='Random Classifier',
+                                         line=dict(dash='dash', color='black')))
+                fig.update_layout(title="ROC Curves Comparison", xaxis_title='False Positive Rate',
+                                  yaxis_title='True Positive Rate')
+                st.plotly_chart(fig, use_container_width=True)
             with col2:
-                try:
-                    st.image('roc_curves.png', caption='ROC Curves')
-                except FileNotFoundError:
-                    st.info("ROC curves image not found.")
+                fig = go.Figure()
+                for model_name, data in curves.items():
+                    fig.add_trace(go.Scatter(x=data['pr_recall'], y=data['pr_precision'], mode='lines', name=model_name))
+                fig.update_layout(title="Precision-Recall Curves", xaxis_title='Recall', yaxis_title='Precision')
+                st.plotly_chart(fig, use_container_width=True)
             
+            # Confusion matrix of the deployed model
             try:
-                st.image('feature_importance.png', caption='Feature Importance')
-            except FileNotFoundError:
-                st.info("Feature importance image not found.")
-        except Exception as e:
-            st.info(f"Performance visualization images not found. Run model_training.py to generate them. Error: {str(e)}")
+                deployed = select_deployed_model(deployment)
+            except ValueError:
+                deployed = results_df['f1_score'].idxmax()
+            if deployed in curves:
+                fig = px.imshow(curves[deployed]['confusion_matrix'], text_auto=True,
+                                x=['No Churn', 'Churn'], y=['No Churn', 'Churn'],
+                                labels={'x': 'Predicted', 'y': 'Actual', 'color': 'Count'},
+                                color_continuous_scale='Blues', title=f"Confusion Matrix - {deployed}")
+                st.plotly_chart(fig, use_container_width=True)
+            
+            # Feature importance (tree-based models)
+            tree_models = [name for name, data in curves.items() if 'feature_importance' in data]
+            if tree_models:
+                cols = st.columns(len(tree_models))
+                for col, model_name in zip(cols, tree_models):
+                    with col:
+                        importance = pd.DataFrame({
+                            'feature': feature_names,
+                            'importance': curves[model_name]['feature_importance']
+                        }).sort_values('importance', ascending=False).head(15)
+                        fig = px.bar(importance, x='importance', y='feature', orientation='h',
+                                     title=f"{model_name} - Top 15 Features",
+                                     color='importance', color_continuous_scale='Viridis')
+                        fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+                        st.plotly_chart(fig, use_container_width=True)
     
     except FileNotFoundError:
         st.warning("Model results not found. Please run model_training.py first.")
@@ -0,0 +1,195 @@
+"""
+Artifact Store for Spotify Churn Prediction
+Content-addressed, versioned storage of trained models, preprocessors and
+reports. Every artifact is stored once under its SHA-256; a release is a
+manifest naming the artifacts of one training run, and refs such as "best"
+are small pointer files that are swapped atomically, so promotions and
+rollbacks never copy model bytes.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+ARTIFACT_STORE_DIR = 'artifacts'
+
+def _write_atomic(path, data):
+    """Write bytes to path via a temporary file and an atomic rename"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class ArtifactStore:
+    """
+    Layout:
+        objects/<2 hex>/<64 hex>   immutable artifact bytes, named by SHA-256
+        refs/<name>.json           current value of a ref, e.g. {"release": ..., "model": ...}
+        refs/<name>.log            one JSON line per ref change, for history and rollback
+    Releases are JSON manifests stored as objects themselves, so a release id
+    is the hash of its manifest.
+    """
+    
+    def __init__(self, root=ARTIFACT_STORE_DIR):
+        self.root = root
+    
+    def object_path(self, digest):
+        """Filesystem path of a stored object (read-only by convention)"""
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+    
+    def put(self, data):
+        """Store bytes once and return their SHA-256; existing objects are not rewritten"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        return digest
+    
+    def put_object(self, obj):
+        """Pickle and store a Python object"""
+        return self.put(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    
+    def put_file(self, filepath):
+        """Store a file's bytes"""
+        with open(filepath, 'rb') as f:
+            return self.put(f.read())
+    
+    def get(self, digest):
+        """Bytes of a stored object"""
+        with open(self.object_path(digest), 'rb') as f:
+            return f.read()
+    
+    def load_object(self, digest):
+        """Unpickle a stored object"""
+        with open(self.object_path(digest), 'rb') as f:
+            return pickle.load(f)
+    
+    def create_release(self, artifacts, best_model=None, parent=None, metadata=None):
+        """
+        Record one training run: artifacts maps names (e.g. 'model:XGBoost',
+        'preprocessor') to object digests. Returns the release id.
+        """
+        manifest = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'artifacts': dict(sorted(artifacts.items())),
+            'best_model': best_model,
+            'parent': parent,
+            'metadata': metadata or {},
+        }
+        return self.put(json.dumps(manifest, indent=2).encode())
+    
+    def get_release(self, release_id):
+        """Manifest of a release"""
+        return json.loads(self.get(release_id))
+    
+    def _ref_path(self, name, ext='.json'):
+        return os.path.join(self.root, 'refs', name + ext)
+    
+    def get_ref(self, name):
+        """Current value of a ref, or None if it was never set"""
+        try:
+            with open(self._ref_path(name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def set_ref(self, name, value, action='set'):
+        """Point a ref at a new value atomically and log the change"""
+        previous = self.get_ref(name)
+        if action == 'rollback':
+            # Roll back past the entry that introduced the target, so repeated rollbacks keep going back
+            entry = next((e for e in reversed(self.ref_history(name)) if e['value'] == value), None)
+            previous = entry['previous'] if entry else None
+        _write_atomic(self._ref_path(name), json.dumps(value).encode())
+        entry = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'action': action, 'value': value, 'previous': previous}
+        with open(self._ref_path(name, '.log'), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    
+    def ref_history(self, name):
+        """All logged changes of a ref, oldest first"""
+        try:
+            with open(self._ref_path(name, '.log')) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+    
+    def rollback(self, name):
+        """Point a ref back at the value it had before its current value"""
+        history = self.ref_history(name)
+        if not history or history[-1]['previous'] is None:
+            raise ValueError(f"Ref '{name}' has no earlier value to roll back to")
+        target = history[-1]['previous']
+        self.set_ref(name, target, action='rollback')
+        return target
+    
+    def promote(self, release_id, model_name=None, ref='best'):
+        """Point ref at a model of a release (default: the release's own best model)"""
+        manifest = self.get_release(release_id)
+        model_name = model_name or manifest['best_model']
+        if f'model:{model_name}' not in manifest['artifacts']:
+            raise ValueError(f"Release {release_id[:12]} has no model '{model_name}'")
+        self.set_ref(ref, {'release': release_id, 'model': model_name}, action='promote')
+    
+    def resolve(self, ref='best'):
+        """
+        Read a ref once and return (release_id, manifest, model_name), or None.
+        Callers load every artifact from this one manifest, so a concurrent
+        promotion can never mix artifacts from two releases.
+        """
+        value = self.get_ref(ref)
+        if value is None:
+            return None
+        return value['release'], self.get_release(value['release']), value.get('model')
+    
+    def releases(self):
+        """Releases recorded by the 'latest' ref, newest first"""
+        seen = []
+        for entry in reversed(self.ref_history('latest')):
+            release_id = entry['value']['release']
+            if release_id not in seen:
+                seen.append(release_id)
+        return seen
+
+def main(store, promote=None, model_name=None, rollback=False):
+    """Promote or roll back the "best" ref, then list releases"""
+    if promote:
+        matches = [r for r in store.releases() if r.startswith(promote)]
+        if len(matches) != 1:
+            raise ValueError(f"'{promote}' matches {len(matches)} releases")
+        store.promote(matches[0], model_name)
+        print(f"Promoted: {matches[0][:12]} ({store.get_ref('best')['model']})")
+    elif rollback:
+        target = store.rollback('best')
+        print(f"Rolled back to: {target['release'][:12]} ({target['model']})")
+    
+    best = store.get_ref('best') or {}
+    for release_id in store.releases():
+        manifest = store.get_release(release_id)
+        marker = '*' if best.get('release') == release_id else ' '
+        models = [name.split(':', 1)[1] for name in manifest['artifacts'] if name.startswith('model:')]
+        print(f"{marker} {release_id[:12]}  {manifest['created']}  best: {manifest['best_model']}  "
+              f"models: {', '.join(models)}")
+    if best:
+        print(f"\n* best -> {best['release'][:12]} ({best['model']})")
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='List, promote and roll back stored model releases')
+    parser.add_argument('--root', default=ARTIFACT_STORE_DIR, help='Artifact store directory')
+    parser.add_argument('--promote', metavar='RELEASE', help='Point "best" at a release (id or unique prefix)')
+    parser.add_argument('--model', help="Model of the release to promote (default: the release's best model)")
+    parser.add_argument('--rollback', action='store_true', help='Point "best" back at its previous value')
+    args = parser.parse_args()
+    
+    main(ArtifactStore(args.root), args.promote, args.model, args.rollback)
@@ -0,0 +1,368 @@
+"""
+Compact Tree Ensembles for Spotify Churn Prediction
+Flattens fitted Random Forest and XGBoost models into a few contiguous typed
+arrays saved as an uncompressed .npz, which loads by memory-mapping its
+members in milliseconds (no scikit-learn/xgboost objects are unpickled) and
+is shared read-only through the page cache by every serving process.
+"""
+
+import io
+import json
+import os
+import pickle
+import struct
+import time
+import zipfile
+
+import numpy as np
+
+THRESHOLD_DTYPES = ('float32', 'float16', 'uint8')
+
+# Largest |P(1) difference| from the original model accepted for exact (float32) exports
+EXACT_TOLERANCE = 1e-5
+
+def compact_path(model_name, filepath_prefix='churn_model'):
+    """Compact .npz file of one exported model, next to its pickle (see model_selection.model_path)"""
+    return f"{filepath_prefix}_{model_name.lower().replace(' ', '_')}.npz"
+
+def _round_down(values, dtype=np.float32):
+    """Largest dtype value <= each value, so x <= t keeps its meaning for every x representable in dtype"""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(dtype)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], dtype(-np.inf))
+    return rounded
+
+def _random_forest_trees(model):
+    """(feature, threshold, left, right, value, missing_left) per tree of a RandomForestClassifier (or one DecisionTreeClassifier)"""
+    if list(model.classes_) != [0, 1] or model.n_outputs_ != 1:
+        raise ValueError("Only binary 0/1 random forests can be exported")
+    for estimator in getattr(model, 'estimators_', [model]):
+        tree = estimator.tree_
+        value = tree.value[:, 0, :]
+        # Class fractions (counts in older scikit-learn versions)
+        proba = value[:, 1] / np.maximum(value.sum(axis=1), np.finfo(np.float64).tiny)
+        missing_left = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8))
+        yield (tree.feature, _round_down(tree.threshold), tree.children_left, tree.children_right,
+               proba, np.asarray(missing_left, dtype=bool))
+
+def _xgboost_trees(learner):
+    """(feature, threshold, left, right, value, missing_left) per tree of a binary:logistic XGBoost learner (JSON model)"""
+    if learner['objective']['name'] != 'binary:logistic':
+        raise ValueError(f"Only binary:logistic XGBoost models can be exported, not {learner['objective']['name']}")
+    booster = learner['gradient_booster']
+    if booster.get('name', 'gbtree') != 'gbtree':
+        raise ValueError("Only gbtree XGBoost models can be exported")
+    for tree in booster['model']['trees']:
+        if any(tree['split_type']):
+            raise ValueError("Categorical XGBoost splits cannot be exported")
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        # XGBoost goes left when x < condition, i.e. x <= the next float32 below it
+        threshold = np.nextafter(conditions, np.float32(-np.inf))
+        yield (np.asarray(tree['split_indices']), threshold, left, np.asarray(tree['right_children']),
+               np.where(left == -1, conditions, 0), np.asarray(tree['default_left'], dtype=bool))
+
+def _base_margin(learner):
+    """Raw margin every XGBoost prediction starts from (base_score is stored as a probability)"""
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    return float(np.log(base_score / (1 - base_score)))
+
+def _quantize_thresholds(feature, threshold, is_leaf, n_features, max_edges=255):
+    """
+    Replace float thresholds by uint8 codes into per-feature tables of the
+    distinct split values (exact while a feature has at most max_edges
+    distinct thresholds, otherwise snapped to max_edges quantiles).
+    Returns (codes, bin_edges, bin_offsets, n_snapped_features).
+    """
+    codes = np.full(len(threshold), 255, dtype=np.uint8)  # leaves: every input code is <= 255
+    edges, offsets, n_snapped = [], [0], 0
+    for f in range(n_features):
+        nodes = np.flatnonzero((feature == f) & ~is_leaf)
+        values = np.unique(threshold[nodes])
+        if len(values) > max_edges:
+            values = np.unique(np.quantile(values, np.linspace(0, 1, max_edges), method='nearest'))
+            n_snapped += 1
+        if len(nodes):
+            # Index of each threshold in the table, or of the nearest edge once the table was thinned
+            upper = np.minimum(np.searchsorted(values, threshold[nodes]), len(values) - 1)
+            lower = np.maximum(upper - 1, 0)
+            nearer_lower = np.abs(threshold[nodes] - values[lower]) < np.abs(values[upper] - threshold[nodes])
+            codes[nodes] = np.where(nearer_lower, lower, upper)
+        edges.append(values.astype(np.float32))
+        offsets.append(offsets[-1] + len(values))
+    return codes, np.concatenate(edges), np.asarray(offsets, dtype=np.int32), n_snapped
+
+def _memmap_npz(filepath):
+    """Memory-map every member of an uncompressed .npz read-only: {name: array}"""
+    arrays = {}
+    with open(filepath, 'rb') as f, zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{filepath} is compressed and cannot be memory-mapped")
+            # Member data follows its local file header and the .npy header
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(filepath, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+class CompactEnsemble:
+    """
+    A binary tree ensemble as flat node arrays, with predict/predict_proba
+    like the scikit-learn and XGBoost classifiers it was exported from.
+    Sibling nodes are stored next to each other, so a node needs only its
+    left child: every tree is walked for all rows at once as
+    node = left[node] + (x[feature[node]] > threshold[node]), and leaves
+    point at themselves. Random forests average the leaf probabilities;
+    XGBoost adds the leaf margins to its base margin and applies a sigmoid.
+    Thresholds are float32 (exact), float16 or uint8 codes into per-feature
+    tables of split values.
+    """
+    
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.meta = json.loads(str(arrays['meta'][()]))
+        self.kind = self.meta['kind']
+        self.threshold_dtype = self.meta['threshold_dtype']
+        self.n_features_in_ = self.meta['n_features']
+        self.classes_ = np.array([0, 1])
+    
+    @classmethod
+    def from_model(cls, model, threshold_dtype='float32', sparse_input=False):
+        """
+        Export a fitted RandomForestClassifier, DecisionTreeClassifier or
+        XGBClassifier. sparse_input marks models trained on scipy sparse
+        matrices: XGBoost treats the entries absent from those as missing, so
+        the export does too (scikit-learn treats them as zeros).
+        """
+        if threshold_dtype not in THRESHOLD_DTYPES:
+            raise ValueError(f"threshold_dtype must be one of {THRESHOLD_DTYPES}")
+        if hasattr(model, 'estimators_') or hasattr(model, 'tree_'):
+            kind, trees, base_margin = 'random_forest', _random_forest_trees(model), 0.0
+        elif hasattr(model, 'get_booster'):
+            learner = json.loads(model.get_booster().save_raw('json'))['learner']
+            kind, trees, base_margin = 'xgboost', _xgboost_trees(learner), _base_margin(learner)
+        else:
+            raise ValueError(f"Cannot export {type(model).__name__}: only Random Forest, decision tree and XGBoost models")
+        
+        columns = {name: [] for name in ('feature', 'threshold', 'left', 'value', 'missing_left')}
+        roots, max_depth, n_nodes = [], 0, 0
+        for feature, threshold, left, right, value, missing_left in trees:
+            # Breadth-first renumbering that places the children of every split side by side
+            order, depth = [0], {0: 0}
+            position = {0: 0}
+            new_left = []
+            for node in order:
+                if left[node] == -1:
+                    new_left.append(n_nodes + position[node])
+                    continue
+                for child in (left[node], right[node]):
+                    position[child] = len(order)
+                    depth[child] = depth[node] + 1
+                    order.append(child)
+                new_left.append(n_nodes + position[left[node]])
+            order = np.asarray(order)
+            is_leaf = left[order] == -1
+            columns['feature'].append(np.where(is_leaf, 0, feature[order]))
+            columns['threshold'].append(np.where(is_leaf, np.float32(np.inf), threshold[order]))
+            columns['left'].append(np.asarray(new_left))
+            columns['value'].append(np.where(is_leaf, value[order], 0))
+            # Leaves keep missing values in place too
+            columns['missing_left'].append(missing_left[order] | is_leaf)
+            roots.append(n_nodes)
+            max_depth = max(max_depth, max(depth.values()))
+            n_nodes += len(order)
+        
+        n_features = int(model.n_features_in_)
+        feature = np.concatenate(columns['feature']).astype(np.uint16 if n_features < 2 ** 16 else np.int32)
+        threshold = np.concatenate(columns['threshold']).astype(np.float32)
+        left = np.concatenate(columns['left']).astype(np.int32)
+        arrays = {
+            'feature': feature,
+            'left': left,
+            'value': np.concatenate(columns['value']).astype(np.float32),
+            'missing_left': np.concatenate(columns['missing_left']),
+            'roots': np.asarray(roots, dtype=np.int32),
+        }
+        n_snapped = 0
+        if threshold_dtype == 'uint8':
+            is_leaf = left == np.arange(len(left))
+            arrays['threshold'], arrays['bin_edges'], arrays['bin_offsets'], n_snapped = _quantize_thresholds(
+                feature, threshold, is_leaf, n_features
+            )
+        else:
+            arrays['threshold'] = _round_down(threshold, np.dtype(threshold_dtype).type)
+        arrays['meta'] = np.array(json.dumps({
+            'kind': kind,
+            'threshold_dtype': threshold_dtype,
+            'n_features': n_features,
+            'n_trees': len(roots),
+            'max_depth': max_depth,
+            'base_margin': base_margin,
+            'n_snapped_features': n_snapped,
+            'implicit_missing': bool(sparse_input and kind == 'xgboost'),
+        }))
+        return cls(arrays)
+    
+    def to_bytes(self):
+        """The uncompressed .npz bytes (uncompressed so that load() can memory-map them)"""
+        buffer = io.BytesIO()
+        np.savez(buffer, **{name: np.asarray(array) for name, array in self.arrays.items()})
+        return buffer.getvalue()
+    
+    def save(self, filepath):
+        """
+        Write the .npz file via a temp file and rename, so processes that have
+        the previous file memory-mapped keep reading it intact
+        """
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, filepath)
+        print(f"Saved: {filepath}")
+    
+    @classmethod
+    def load(cls, filepath):
+        """Memory-map an exported ensemble read-only (any file holding to_bytes(), e.g. an artifact store object)"""
+        return cls(_memmap_npz(filepath))
+    
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+    
+    def _as_float32(self, X):
+        if hasattr(X, 'toarray'):
+            if self.meta.get('implicit_missing'):
+                # Entries absent from the sparse matrix are missing values, as in XGBoost
+                coo = X.tocoo()
+                X = np.full(coo.shape, np.nan, dtype=np.float32)
+                X[coo.row, coo.col] = coo.data
+            else:
+                X = X.toarray()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+        return X
+    
+    def _leaf_values(self, X):
+        """Leaf value reached in every tree by every row: (n_rows, n_trees)"""
+        arrays = self.arrays
+        feature, left, threshold = arrays['feature'], arrays['left'], arrays['threshold']
+        missing_left = arrays['missing_left']
+        missing = np.isnan(X)
+        if self.threshold_dtype == 'uint8':
+            # Per-feature bin codes: x <= edges[c] exactly when code(x) <= c
+            edges, offsets = arrays['bin_edges'], arrays['bin_offsets']
+            X = np.column_stack([
+                np.searchsorted(edges[offsets[f]:offsets[f + 1]], X[:, f]) for f in range(X.shape[1])
+            ]).astype(np.int16) if X.shape[1] else np.empty(X.shape, dtype=np.int16)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(np.asarray(arrays['roots']), (len(X), len(arrays['roots'])))
+        for _ in range(self.meta['max_depth']):
+            f = feature[nodes]
+            go_right = np.where(missing[rows, f], ~missing_left[nodes], X[rows, f] > threshold[nodes])
+            nodes = left[nodes] + go_right
+        return arrays['value'][nodes]
+    
+    def predict_proba(self, X, batch_rows=10_000):
+        """Class probabilities [P(0), P(1)] per row"""
+        X = self._as_float32(X)
+        positive = np.empty(len(X))
+        for start in range(0, len(X), batch_rows):
+            values = self._leaf_values(X[start:start + batch_rows]).astype(np.float64)
+            if self.kind == 'random_forest':
+                positive[start:start + batch_rows] = values.mean(axis=1)
+            else:
+                margin = self.meta['base_margin'] + values.sum(axis=1)
+                positive[start:start + batch_rows] = 1 / (1 + np.exp(-margin))
+        return np.column_stack([1 - positive, positive])
+    
+    def predict(self, X):
+        """Predicted class per row (churn when P(1) > 0.5)"""
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
+    
+    def describe(self):
+        return (f"{self.meta['n_trees']} trees, {len(self.arrays['left']):,} nodes, max depth {self.meta['max_depth']}, "
+                f"{self.threshold_dtype} thresholds, {self.nbytes / 1024:.1f} KB")
+
+def compare_predictions(model, compact, X):
+    """Fidelity of an export: mean and max |P(1) difference| and prediction agreement with the original model on X"""
+    expected = model.predict_proba(X)[:, 1]
+    actual = compact.predict_proba(X)[:, 1]
+    n_rows = X.shape[0]
+    return {
+        'mean_abs_diff': float(np.mean(np.abs(expected - actual))) if n_rows else 0.0,
+        'max_abs_diff': float(np.max(np.abs(expected - actual))) if n_rows else 0.0,
+        'agreement': float(np.mean((expected > 0.5) == (actual > 0.5))) if n_rows else 1.0,
+    }
+
+def fidelity_ok(fidelity, threshold_dtype='float32'):
+    """Whether an export may replace its model: identical predictions, and probabilities within EXACT_TOLERANCE for float32"""
+    if fidelity['agreement'] < 1.0:
+        return False
+    return threshold_dtype != 'float32' or fidelity['max_abs_diff'] <= EXACT_TOLERANCE
+
+def main(model_file, output_path=None, threshold_dtype='float32', sparse_input=False):
+    """Export one pickled model and report its size, load time and fidelity on the processed test set"""
+    print("="*60)
+    print("SPOTIFY CHURN PREDICTION - COMPACT MODEL EXPORT")
+    print("="*60)
+    
+    start = time.perf_counter()
+    with open(model_file, 'rb') as f:
+        model = pickle.load(f)
+    pickle_load_ms = (time.perf_counter() - start) * 1000
+    
+    compact = CompactEnsemble.from_model(model, threshold_dtype, sparse_input)
+    output_path = output_path or model_file.rsplit('.', 1)[0] + '.npz'
+    compact.save(output_path)
+    
+    start = time.perf_counter()
+    compact = CompactEnsemble.load(output_path)
+    compact_load_ms = (time.perf_counter() - start) * 1000
+    
+    print(f"\n{compact.describe()}")
+    print(f"  Size: {os.path.getsize(output_path) / 1024:.1f} KB (pickle {os.path.getsize(model_file) / 1024:.1f} KB)")
+    print(f"  Load: {compact_load_ms:.2f} ms (pickle {pickle_load_ms:.2f} ms)")
+    if compact.meta['n_snapped_features']:
+        print(f"  {compact.meta['n_snapped_features']} features have over 255 split values; their uint8 thresholds are approximate")
+    
+    try:
+        from data_preprocessing import load_processed_data
+        _, X_test, _, _, _ = load_processed_data()
+    except FileNotFoundError:
+        print("\nNo processed test set found; skipping the fidelity check")
+    else:
+        fidelity = compare_predictions(model, compact, X_test)
+        print(f"  Fidelity on {X_test.shape[0]:,} test rows: max |dP| {fidelity['max_abs_diff']:.2e}, "
+              f"prediction agreement {fidelity['agreement']:.2%}")
+        if not fidelity_ok(fidelity, threshold_dtype):
+            print(f"  WARNING: the export does not reproduce the model's predictions; do not serve {output_path}")
+    
+    print("\n[SUCCESS] Compact export completed!")
+    return compact
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Export a pickled Random Forest or XGBoost model as a compact .npz')
+    parser.add_argument('model_file', nargs='?', default='churn_model_random_forest.pkl', help='Pickled model to export')
+    parser.add_argument('--output', default=None, help='Output .npz (default: next to the pickle)')
+    parser.add_argument('--thresholds', choices=THRESHOLD_DTYPES, default='float32',
+                        help='Threshold storage: float32 (exact), float16 or uint8 codes (exact up to 255 splits per feature)')
+    parser.add_argument('--sparse-input', action='store_true',
+                        help='The model was trained on the sparse multi-hot encoding (absent entries are missing for XGBoost)')
+    args = parser.parse_args()
+    
+    main(args.model_file, args.output, args.thresholds, args.sparse_input)
@@ -5,25 +5,660 @@ This script loads, cleans, and prepares the Spotify dataset for machine learning
 
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+import scipy.sparse as sp
+from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import pickle
+import re
+import hashlib
+import json
+import os
 import warnings
 warnings.filterwarnings('ignore')
 
+# Directory holding columnar copies of the source workbook
+CACHE_DIR = '.cache'
+
+# Directory of the typed binary hand-off between preprocessing and training
+PROCESSED_DATA_DIR = 'processed_data'
+
+# Encoded rows, fingerprints and vocabularies kept between incremental runs
+INCREMENTAL_STATE_DIR = 'incremental_state'
+
+
+def _file_sha256(file_path, block_size=1 << 20):
+    """Hash a file's contents in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    """Write a JSON file via a temp file and rename"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_excel_cached(file_path='Spotify_data.xlsx', columns=None, cache_dir=CACHE_DIR):
+    """
+    Read an Excel workbook through a Parquet cache.
+    The workbook is parsed once and stored as Parquet keyed by its content hash.
+    A small manifest records the workbook's mtime and size so unchanged files
+    are recognised without re-hashing. Falls back to pd.read_excel when
+    pyarrow is not installed or the cache cannot be written.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        df = pd.read_excel(file_path)
+        return df[columns] if columns is not None else df
+    
+    stat = os.stat(file_path)
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    manifest_path = os.path.join(cache_dir, f'{base_name}.json')
+    
+    manifest = None
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+    
+    # mtime and size unchanged: trust the recorded hash, otherwise re-hash
+    if manifest and manifest.get('mtime_ns') == stat.st_mtime_ns and manifest.get('size') == stat.st_size:
+        content_hash = manifest['sha256']
+    else:
+        content_hash = _file_sha256(file_path)
+    
+    cache_path = os.path.join(cache_dir, f'{base_name}.{content_hash[:16]}.parquet')
+    new_manifest = {
+        'source': os.path.abspath(file_path),
+        'sha256': content_hash,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'path': cache_path
+    }
+    
+    if manifest and manifest.get('sha256') == content_hash and os.path.exists(cache_path):
+        # Content unchanged but file touched: refresh mtime so the next load skips hashing
+        if manifest != new_manifest:
+            _write_json_atomic(manifest_path, new_manifest)
+        return pd.read_parquet(cache_path, columns=columns)
+    
+    df = pd.read_excel(file_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temp file first so readers never see a partial cache
+        tmp_path = cache_path + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        
+        # Drop caches of earlier workbook versions
+        if manifest and manifest.get('path') and manifest['path'] != cache_path:
+            try:
+                os.remove(manifest['path'])
+            except OSError:
+                pass
+        
+        _write_json_atomic(manifest_path, new_manifest)
+    except Exception as e:
+        print(f"Warning: could not write data cache ({e})")
+    
+    return df[columns] if columns is not None else df
+
+
+def save_processed_data(X_train, X_test, y_train, y_test, feature_names, data_dir=PROCESSED_DATA_DIR):
+    """
+    Save the train/test split as typed .npy files plus a JSON manifest.
+    Dense features are stored as float32 matrices, sparse CSR features as
+    their data/indices/indptr arrays, and labels as int8. The manifest is
+    written last, so a partially written directory is never picked up.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    # Invalidate the previous dataset before overwriting its arrays
+    for name in os.listdir(data_dir):
+        if name == 'manifest.json' or name.endswith('.npy'):
+            os.remove(os.path.join(data_dir, name))
+    
+    sparse = sp.issparse(X_train)
+    arrays = {}
+    
+    for split, X in (('train', X_train), ('test', X_test)):
+        if sparse:
+            X = sp.csr_matrix(X, dtype=np.float32)
+            arrays[f'X_{split}_data'] = X.data
+            arrays[f'X_{split}_indices'] = X.indices.astype(np.int32)
+            arrays[f'X_{split}_indptr'] = X.indptr.astype(np.int64)
+        else:
+            arrays[f'X_{split}'] = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+    arrays['y_train'] = np.asarray(y_train, dtype=np.int8)
+    arrays['y_test'] = np.asarray(y_test, dtype=np.int8)
+    
+    for name, array in arrays.items():
+        np.save(os.path.join(data_dir, f'{name}.npy'), array)
+    
+    _write_json_atomic(os.path.join(data_dir, 'manifest.json'), {
+        'format': 'csr' if sparse else 'dense',
+        'feature_names': list(feature_names),
+        'n_features': len(feature_names),
+        'shapes': {'X_train': list(X_train.shape), 'X_test': list(X_test.shape)},
+        'arrays': {name: {'dtype': str(array.dtype), 'shape': list(array.shape)} for name, array in arrays.items()}
+    })
+
+
+def load_processed_data(data_dir=PROCESSED_DATA_DIR, mmap_mode='r'):
+    """
+    Open a dataset written by save_processed_data.
+    Arrays are memory-mapped read-only by default, so several training
+    processes share one copy through the page cache.
+    Returns (X_train, X_test, y_train, y_test, feature_names).
+    """
+    with open(os.path.join(data_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    
+    def load(name):
+        return np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+    
+    if manifest['format'] == 'csr':
+        X_train, X_test = (
+            sp.csr_matrix(
+                (load(f'X_{split}_data'), load(f'X_{split}_indices'), load(f'X_{split}_indptr')),
+                shape=tuple(manifest['shapes'][f'X_{split}'])
+            )
+            for split in ('train', 'test')
+        )
+    else:
+        X_train, X_test = load('X_train'), load('X_test')
+    
+    return X_train, X_test, load('y_train'), load('y_test'), manifest['feature_names']
+
+
+def row_fingerprints(df):
+    """
+    Fingerprint raw survey rows as uint64 values.
+    Identical rows are told apart by their occurrence number, so duplicated
+    answers in an export are tracked as separate rows.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy(dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        return hashes + occurrence * np.uint64(0x9E3779B97F4A7C15)
+
+
+def smallest_int_dtype(n_values):
+    """Smallest signed integer dtype holding codes 0..n_values-1"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+def _memory_mb(data):
+    """Memory footprint of a DataFrame, Series or array in MB (deep for object columns)"""
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        usage = data.memory_usage(deep=True, index=False)
+        return float(np.sum(usage)) / 1e6
+    return data.nbytes / 1e6
+
+
+def fill_missing_values(df):
+    """Fill skipped survey answers with their defaults (category columns included)"""
+    for col, default in MISSING_VALUE_DEFAULTS.items():
+        if col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype) and default not in series.cat.categories:
+                series = series.cat.add_categories([default])
+            df[col] = series.fillna(default)
+    return df
+
+
+def _as_category_strings(values):
+    """Coerce values to category strings, with missing values as 'nan' on every pandas version"""
+    return pd.Series(values).astype(object).fillna('nan').astype(str)
+
+
+class CategoryEncoder:
+    """
+    Label encoder backed by a precomputed category -> code hash map.
+    Codes follow sorted category order, like sklearn's LabelEncoder, so
+    artifacts stay interchangeable. Batches are encoded in one vectorized
+    lookup per column; unseen categories map to unknown_value instead of raising.
+    """
+    
+    def __init__(self, unknown_value=0):
+        self.unknown_value = unknown_value
+        self.classes_ = None
+        self.index_ = {}
+        self._categories = None
+    
+    @classmethod
+    def from_classes(cls, classes, unknown_value=0):
+        """Build an encoder from an existing vocabulary (e.g. a fitted LabelEncoder's classes_)"""
+        encoder = cls(unknown_value=unknown_value)
+        encoder._set_classes(sorted(str(c) for c in classes))
+        return encoder
+    
+    def _set_classes(self, classes):
+        self.classes_ = np.asarray(classes, dtype=object)
+        self.index_ = {category: code for code, category in enumerate(self.classes_)}
+        self._categories = pd.Index(self.classes_)
+    
+    def fit(self, values):
+        """Learn the sorted vocabulary of values"""
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Only the (observed) categories need converting, not every row
+            classes = set(_as_category_strings(values.cat.remove_unused_categories().cat.categories))
+            if values.isna().any():
+                classes.add('nan')
+            self._set_classes(sorted(classes))
+        else:
+            self._set_classes(sorted(pd.unique(_as_category_strings(values))))
+        return self
+    
+    def transform(self, values):
+        """Encode a batch of values; unseen categories get unknown_value"""
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Encode each category once and gather through the category codes;
+            # the trailing slot (code -1) holds the code of missing values
+            lookup = np.append(
+                self.transform(values.cat.categories.astype(object)),
+                self.index_.get('nan', self.unknown_value)
+            )
+            return lookup[values.cat.codes.to_numpy()]
+        
+        codes = pd.Categorical(_as_category_strings(values), categories=self._categories).codes.astype(np.int64)
+        codes[codes < 0] = self.unknown_value
+        return codes
+    
+    def fit_transform(self, values):
+        """Fit the vocabulary and encode values"""
+        return self.fit(values).transform(values)
+    
+    def extend(self, values):
+        """
+        Append categories not yet in the vocabulary and return them.
+        New categories get the next free codes, so existing codes stay valid
+        (the vocabulary is then no longer in sorted order).
+        """
+        new_categories = sorted(set(pd.unique(_as_category_strings(values))) - self.index_.keys())
+        if new_categories:
+            self._set_classes(list(self.classes_) + new_categories)
+        return new_categories
+    
+    def encode(self, value):
+        """Encode a single value with one dict lookup"""
+        return self.index_.get(str(value), self.unknown_value)
+    
+    def inverse_transform(self, codes):
+        """Map codes back to category strings"""
+        return self.classes_[np.asarray(codes)]
+    
+    def __len__(self):
+        return len(self.classes_)
+
+
+class MultiHotEncoder:
+    """
+    Token vocabulary for a comma-separated multi-select column.
+    Each distinct cell value is split into tokens once; rows are then
+    gathered from that small per-value CSR matrix through the value codes,
+    producing a sparse multi-hot matrix with one column per token.
+    """
+    
+    def __init__(self, separator=','):
+        self.separator = separator
+        self.tokens_ = None
+        self.index_ = {}
+    
+    def _split(self, value):
+        if not isinstance(value, str):
+            return []
+        return [token.strip() for token in value.split(self.separator) if token.strip()]
+    
+    def fit(self, values):
+        """Learn the sorted token vocabulary"""
+        uniques = pd.unique(pd.Series(values).dropna())
+        self.tokens_ = np.asarray(sorted({token for value in uniques for token in self._split(value)}), dtype=object)
+        self.index_ = {token: idx for idx, token in enumerate(self.tokens_)}
+        return self
+    
+    def transform(self, values):
+        """Encode values as a CSR multi-hot matrix; unseen tokens are dropped"""
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+        
+        indptr = [0]
+        indices = []
+        for value in uniques:
+            token_ids = sorted({self.index_[t] for t in self._split(value) if t in self.index_})
+            indices.extend(token_ids)
+            indptr.append(len(indices))
+        # Trailing empty row for missing values (code -1)
+        indptr.append(len(indices))
+        
+        per_value = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(uniques) + 1, len(self.tokens_))
+        )
+        return per_value[codes]
+    
+    def fit_transform(self, values):
+        """Fit the token vocabulary and encode values"""
+        return self.fit(values).transform(values)
+    
+    def get_feature_names(self, column):
+        """Output column names, one per token"""
+        return [f'{column}={token}' for token in self.tokens_]
+    
+    def __len__(self):
+        return len(self.tokens_)
+
+
+def build_sparse_features(df, label_encoders, multi_hot_encoders, source_columns):
+    """
+    Assemble the CSR feature matrix for the multi-hot mode.
+    Multi-select columns expand to token blocks, other categorical columns
+    become a single label-code column, numeric columns pass through.
+    """
+    blocks = []
+    for col in source_columns:
+        if col in multi_hot_encoders:
+            blocks.append(multi_hot_encoders[col].transform(df[col]))
+        else:
+            if col in label_encoders:
+                values = label_encoders[col].transform(df[col])
+            else:
+                values = pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy()
+            blocks.append(sp.csr_matrix(np.asarray(values, dtype=np.float32).reshape(-1, 1)))
+    return sp.hstack(blocks, format='csr')
+
+
+class FusedPreprocessor:
+    """
+    Serving-time preprocessor mapping raw answers straight to scaled features.
+    For a categorical column, label encoding followed by standard scaling is a
+    constant per category, so the scaled value of every category is
+    precomputed into a dict. A request row is then built with one lookup per
+    feature, without DataFrames or sklearn calls. With selected_features
+    (a pruned subset, see feature_selection) only those columns are built.
+    """
+    
+    def __init__(self, feature_names, label_encoders, scaler, selected_features=None):
+        n_features = len(feature_names)
+        mean = scaler.mean_ if getattr(scaler, 'with_mean', True) else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, 'with_std', True) else np.ones(n_features)
+        
+        self.feature_names = list(selected_features or feature_names)
+        positions = {col: idx for idx, col in enumerate(feature_names)}
+        self.columns = []
+        for col in self.feature_names:
+            idx = positions[col]
+            if col in label_encoders:
+                encoder = label_encoders[col]
+                scaled = (np.arange(len(encoder.classes_)) - mean[idx]) / scale[idx]
+                table = dict(zip(encoder.classes_.tolist(), scaled.tolist()))
+                default = float(scaled[encoder.unknown_value])
+            else:
+                table = None
+                default = float((0 - mean[idx]) / scale[idx])
+            self.columns.append((col, table, default, float(mean[idx]), float(scale[idx])))
+    
+    def transform_record(self, record):
+        """Build the scaled (1, n_features) row for one raw record dict"""
+        row = []
+        for col, table, default, mean, scale in self.columns:
+            value = record.get(col)
+            if table is not None:
+                row.append(table.get(str(value), default))
+            else:
+                try:
+                    row.append((float(value) - mean) / scale)
+                except (TypeError, ValueError):
+                    row.append(default)
+        return np.array([row])
+
+
+def _columns_to_ipc(df, columns):
+    """
+    Serialize columns to an Arrow IPC stream. Columns are converted as they
+    are (vectorized, no per-value Python work in the parent); only mixed-type
+    columns Arrow cannot type are sent as category strings.
+    """
+    import pyarrow as pa
+    
+    arrays = []
+    for col in columns:
+        try:
+            arrays.append(pa.array(df[col], from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array(_as_category_strings(df[col]), type=pa.string()))
+    table = pa.Table.from_arrays(arrays, names=list(columns))
+    
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _encode_column_shard(ipc_bytes, shm_name, shape, column_positions):
+    """Worker: encode a shard of columns into the shared code matrix, return vocabularies"""
+    import pyarrow as pa
+    from multiprocessing import shared_memory
+    
+    table = pa.ipc.open_stream(ipc_bytes).read_all()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        codes = np.ndarray(shape, dtype=np.int32, buffer=shm.buf)
+        vocabularies = {}
+        for col, pos in column_positions:
+            # Integers with missing values come back as Python ints, not floats,
+            # so their category strings match the serial path ('1', not '1.0')
+            values = table.column(col).to_pandas(integer_object_nulls=True)
+            encoder = CategoryEncoder().fit(values)
+            codes[:, pos] = encoder.transform(values)
+            vocabularies[col] = encoder.classes_.tolist()
+        del codes
+    finally:
+        shm.close()
+    return vocabularies
+
+
+def upgrade_label_encoders(label_encoders):
+    """Convert legacy sklearn LabelEncoders from older preprocessor.pkl files to CategoryEncoders"""
+    return {
+        col: encoder if isinstance(encoder, CategoryEncoder) else CategoryEncoder.from_classes(encoder.classes_)
+        for col, encoder in label_encoders.items()
+    }
+
+
+class Contains:
+    """Clause matching a regex against the lower-cased string value of a column"""
+    
+    def __init__(self, column, pattern):
+        self.column = column
+        self.pattern = pattern
+        self._regex = re.compile(pattern)
+    
+    def evaluate(self, values):
+        """Evaluate the clause on an array of distinct column values"""
+        return np.array([
+            isinstance(v, str) and self._regex.search(v.lower()) is not None
+            for v in values
+        ], dtype=bool)
+
+
+class AtMost:
+    """Clause matching numeric column values less than or equal to a threshold"""
+    
+    def __init__(self, column, threshold):
+        self.column = column
+        self.threshold = threshold
+    
+    def evaluate(self, values):
+        """Evaluate the clause on an array of distinct column values"""
+        numeric = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+        return numeric <= self.threshold
+
+
+class ChurnRule:
+    """A churn rule that fires when all of its clauses match"""
+    
+    def __init__(self, name, *clauses):
+        self.name = name
+        self.clauses = clauses
+
+
+# Churn business rules; a user churns if any rule fires
+DEFAULT_CHURN_RULES = [
+    # Rule 1: Free plan users not willing to take premium
+    ChurnRule('free_not_willing',
+              Contains('spotify_subscription_plan', 'free'),
+              Contains('premium_sub_willingness', 'no')),
+    # Rule 2: Low recommendation ratings (<= 2 on scale 1-5)
+    ChurnRule('low_rating', AtMost('music_recc_rating', 2)),
+    # Rule 3: Infrequent music listening
+    ChurnRule('infrequent_listening', Contains('music_lis_frequency', 'rarely|never|occasionally')),
+    # Rule 4: Not satisfied with podcast variety
+    ChurnRule('not_satisfied_podcast', Contains('pod_variety_satisfaction', 'not satisfied|dissatisfied|no')),
+    # Rule 5: Very short usage period (new users who might churn)
+    ChurnRule('short_usage', Contains('spotify_usage_period', 'less than|0-6|1-3')),
+]
+
+
+# Survey questions answered with comma-separated multi-selections
+MULTI_VALUED_COLUMNS = [
+    'spotify_listening_device',
+    'fav_music_genre',
+    'music_time_slot',
+    'music_Influencial_mood',
+    'music_lis_frequency',
+    'music_expl_method',
+]
+
+# Column dtypes treated as categorical survey answers
+CATEGORICAL_DTYPES = ['object', 'string', 'category']
+
+# Defaults for survey questions that respondents may skip
+MISSING_VALUE_DEFAULTS = {
+    'preffered_premium_plan': 'Not Applicable',
+    'fav_pod_genre': 'None',
+    'preffered_pod_format': 'No Preference',
+    'pod_host_preference': 'No Preference',
+    'preffered_pod_duration': 'No Preference',
+}
+
+
+def _merge_moments(a, b):
+    """Combine (count, mean, M2) running moments of two batches (Chan et al.)"""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+    return n, mean, m2
+
+
+def iter_data_chunks(file_path, chunksize=100_000):
+    """
+    Yield the survey data in DataFrame chunks of at most chunksize rows.
+    CSV and Parquet inputs are streamed; Excel workbooks are read through the
+    columnar cache and sliced.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+    elif ext == '.parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        df = read_excel_cached(file_path)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+
+def _column_codes(series):
+    """Return (codes, distinct values) for a column; missing values get code -1"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), np.asarray(series.cat.categories, dtype=object)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def evaluate_churn_rules(df, rules=DEFAULT_CHURN_RULES):
+    """
+    Label rows with churn rules in time proportional to column cardinality.
+    Each referenced column is factorized once; every clause is evaluated on
+    the distinct values and the resulting mask is gathered through the codes.
+    """
+    column_codes = {}
+    churn = np.zeros(len(df), dtype=bool)
+    
+    for rule in rules:
+        rule_mask = np.ones(len(df), dtype=bool)
+        for clause in rule.clauses:
+            if clause.column not in column_codes:
+                column_codes[clause.column] = _column_codes(df[clause.column])
+            codes, uniques = column_codes[clause.column]
+            
+            # Trailing False slot so code -1 (missing) never matches
+            lookup = np.append(clause.evaluate(uniques), False)
+            rule_mask &= lookup[codes]
+        churn |= rule_mask
+    
+    return churn.astype(int)
+
+
 class SpotifyDataPreprocessor:
     """Class to handle data preprocessing for Spotify churn prediction"""
     
-    def __init__(self):
+    def __init__(self, churn_rules=None, multi_hot=False, multi_hot_columns=None, n_jobs=1, compact=False):
+        self.churn_rules = churn_rules if churn_rules is not None else DEFAULT_CHURN_RULES
+        self.n_jobs = n_jobs
+        self.compact = compact
+        self.multi_hot = multi_hot
+        self.multi_hot_columns = multi_hot_columns if multi_hot_columns is not None else MULTI_VALUED_COLUMNS
+        self.multi_hot_encoders = {}
+        self.source_columns = None
         self.label_encoders = {}
         self.scaler = StandardScaler()
         self.feature_names = None
+        self.selected_features = None  # pruned model inputs, in feature_names order (None = all)
         
-    def load_data(self, file_path='Spotify_data.xlsx'):
-        """Load the Spotify dataset"""
+        # Streaming fit state (see partial_fit)
+        self._categorical_cols = None
+        self._category_counts = {}
+        self._numeric_moments = {}
+        self._n_seen = 0
+        
+    def load_data(self, file_path='Spotify_data.xlsx', columns=None):
+        """Load the Spotify dataset (CSV, Parquet, or Excel served from the columnar cache)"""
         print("Loading data...")
-        df = pd.read_excel(file_path)
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == '.csv':
+            df = pd.read_csv(file_path, usecols=columns)
+        elif ext == '.parquet':
+            df = pd.read_parquet(file_path, columns=columns)
+        else:
+            df = read_excel_cached(file_path, columns=columns)
         print(f"Data loaded: {df.shape[0]} rows, {df.shape[1]} columns")
+        
+        if self.compact:
+            before = _memory_mb(df)
+            for col in df.select_dtypes(include=CATEGORICAL_DTYPES).columns:
+                df[col] = df[col].astype('category')
+            for col in df.select_dtypes(include=['integer']).columns:
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+            print(f"Compact dtypes: raw data {before:.2f} MB -> {_memory_mb(df):.2f} MB (category/narrow int columns)")
         return df
     
     def create_churn_target(self, df):
@@ -33,43 +668,15 @@ class SpotifyDataPreprocessor:
         - Low recommendation ratings (<= 2)
         - Infrequent music listening
         - Not satisfied with podcast variety
+        - Very short usage period
+        The rules live in self.churn_rules and are evaluated on each column's
+        distinct values, then broadcast back to rows through the value codes.
         """
         print("\nCreating churn target variable...")
         
-        # Initialize churn as 0 (no churn)
-        churn = np.zeros(len(df))
-        
-        # Rule 1: Free plan users not willing to take premium
-        free_not_willing = (
-            (df['spotify_subscription_plan'].str.lower().str.contains('free', na=False)) &
-            (df['premium_sub_willingness'].str.lower().str.contains('no', na=False))
-        )
-        churn[free_not_willing] = 1
-        
-        # Rule 2: Low recommendation ratings (<= 2 on scale 1-5)
-        low_rating = df['music_recc_rating'] <= 2
-        churn[low_rating] = 1
-        
-        # Rule 3: Infrequent music listening
-        infrequent_listening = df['music_lis_frequency'].str.lower().str.contains(
-            'rarely|never|occasionally', na=False, regex=True
-        )
-        churn[infrequent_listening] = 1
-        
-        # Rule 4: Not satisfied with podcast variety
-        not_satisfied_podcast = df['pod_variety_satisfaction'].str.lower().str.contains(
-            'not satisfied|dissatisfied|no', na=False, regex=True
-        )
-        churn[not_satisfied_podcast] = 1
-        
-        # Rule 5: Very short usage period (new users who might churn)
-        short_usage = df['spotify_usage_period'].str.lower().str.contains(
-            'less than|0-6|1-3', na=False, regex=True
-        )
-        churn[short_usage] = 1
-        
-        # Convert to binary (if any rule matches, churn = 1)
-        df['churn'] = (churn > 0).astype(int)
+        df['churn'] = evaluate_churn_rules(df, self.churn_rules)
+        if self.compact:
+            df['churn'] = df['churn'].astype(np.int8)
         
         print(f"Churn distribution:")
         print(df['churn'].value_counts())
@@ -82,29 +689,81 @@ class SpotifyDataPreprocessor:
         print("\nHandling missing values...")
         
         # Fill missing values with appropriate defaults
-        df['preffered_premium_plan'] = df['preffered_premium_plan'].fillna('Not Applicable')
-        df['fav_pod_genre'] = df['fav_pod_genre'].fillna('None')
-        df['preffered_pod_format'] = df['preffered_pod_format'].fillna('No Preference')
-        df['pod_host_preference'] = df['pod_host_preference'].fillna('No Preference')
-        df['preffered_pod_duration'] = df['preffered_pod_duration'].fillna('No Preference')
+        df = fill_missing_values(df)
         
         print("Missing values handled")
         return df
     
     def encode_categorical_features(self, df, categorical_cols):
-        """Encode categorical features using Label Encoding"""
+        """Encode categorical features as sorted-vocabulary label codes"""
         print("\nEncoding categorical features...")
         
         df_encoded = df.copy()
         
-        for col in categorical_cols:
-            if col in df_encoded.columns:
-                le = LabelEncoder()
-                # Handle NaN values
-                df_encoded[col] = df_encoded[col].astype(str)
-                df_encoded[col] = le.fit_transform(df_encoded[col])
-                self.label_encoders[col] = le
-                print(f"  Encoded: {col} ({len(le.classes_)} categories)")
+        n_jobs = os.cpu_count() if self.n_jobs in (None, -1) else self.n_jobs
+        if n_jobs > 1 and len(categorical_cols) > 1:
+            df_encoded = self._encode_categorical_parallel(df_encoded, categorical_cols, n_jobs)
+        else:
+            for col in categorical_cols:
+                if col in df_encoded.columns:
+                    encoder = CategoryEncoder()
+                    # NaN values become the 'nan' category
+                    df_encoded[col] = encoder.fit_transform(df_encoded[col])
+                    self.label_encoders[col] = encoder
+                    print(f"  Encoded: {col} ({len(encoder)} categories)")
+        
+        if self.compact:
+            # Store codes in the narrowest integer type their vocabulary allows
+            before = _memory_mb(df_encoded[categorical_cols])
+            for col in categorical_cols:
+                if col in self.label_encoders:
+                    df_encoded[col] = df_encoded[col].astype(smallest_int_dtype(len(self.label_encoders[col])))
+            print(f"Compact dtypes: encoded codes {before:.2f} MB -> {_memory_mb(df_encoded[categorical_cols]):.2f} MB")
+        
+        return df_encoded
+    
+    def _encode_categorical_parallel(self, df_encoded, categorical_cols, n_jobs):
+        """
+        Encode column shards in worker processes.
+        Each shard is shipped as an Arrow IPC buffer rather than pickled object
+        arrays; workers write int32 codes into a shared-memory matrix and send
+        back only the (small) vocabularies.
+        """
+        import pyarrow as pa
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+        
+        cols = [col for col in categorical_cols if col in df_encoded.columns]
+        n_workers = min(n_jobs, len(cols))
+        shards = [cols[i::n_workers] for i in range(n_workers)]
+        shape = (len(df_encoded), len(cols))
+        position = {col: pos for pos, col in enumerate(cols)}
+        print(f"  Parallel mode: {len(cols)} columns across {n_workers} worker processes")
+        
+        shm = shared_memory.SharedMemory(create=True, size=max(1, np.prod(shape) * np.dtype(np.int32).itemsize))
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = [
+                    executor.submit(
+                        _encode_column_shard, _columns_to_ipc(df_encoded, shard),
+                        shm.name, shape, [(col, position[col]) for col in shard]
+                    )
+                    for shard in shards
+                ]
+                vocabularies = {}
+                for future in futures:
+                    vocabularies.update(future.result())
+            
+            codes = np.ndarray(shape, dtype=np.int32, buffer=shm.buf)
+            for col in cols:
+                encoder = CategoryEncoder.from_classes(vocabularies[col])
+                df_encoded[col] = codes[:, position[col]].astype(np.int64)
+                self.label_encoders[col] = encoder
+                print(f"  Encoded: {col} ({len(encoder)} categories)")
+            del codes
+        finally:
+            shm.close()
+            shm.unlink()
         
         return df_encoded
     
@@ -116,7 +775,10 @@ class SpotifyDataPreprocessor:
         feature_cols = [col for col in df.columns if col != 'churn']
         
         # Identify categorical columns
-        categorical_cols = df[feature_cols].select_dtypes(include=['object']).columns.tolist()
+        categorical_cols = df[feature_cols].select_dtypes(include=CATEGORICAL_DTYPES).columns.tolist()
+        
+        if self.multi_hot:
+            return self.prepare_sparse_features(df, feature_cols, categorical_cols)
         
         # Encode categorical features
         df_encoded = self.encode_categorical_features(df, categorical_cols)
@@ -131,6 +793,100 @@ class SpotifyDataPreprocessor:
         
         return X, y
     
+    def prepare_sparse_features(self, df, feature_cols, categorical_cols):
+        """
+        Build a CSR feature matrix where multi-select columns are split into
+        token vocabularies and multi-hot encoded; memory grows with the number
+        of selected tokens rather than the number of distinct combinations.
+        """
+        print("\nEncoding features (multi-hot mode)...")
+        
+        self.source_columns = feature_cols
+        self.feature_names = []
+        
+        for col in feature_cols:
+            if col in self.multi_hot_columns and col in categorical_cols:
+                encoder = MultiHotEncoder().fit(df[col])
+                self.multi_hot_encoders[col] = encoder
+                self.feature_names.extend(encoder.get_feature_names(col))
+                print(f"  Multi-hot: {col} ({df[col].nunique()} combinations -> {len(encoder)} tokens)")
+            else:
+                if col in categorical_cols:
+                    encoder = CategoryEncoder().fit(df[col])
+                    self.label_encoders[col] = encoder
+                    print(f"  Encoded: {col} ({len(encoder)} categories)")
+                self.feature_names.append(col)
+        
+        X = build_sparse_features(df, self.label_encoders, self.multi_hot_encoders, self.source_columns)
+        y = df['churn']
+        
+        print(f"Final feature count: {len(self.feature_names)} ({X.nnz} stored values)")
+        
+        return X, y
+    
+    def prepare_features_inplace(self, df, test_size=0.2, random_state=42):
+        """
+        Encode, split and scale with about one copy of the feature matrix.
+        The stratified split is drawn as index arrays first; every column is
+        then encoded straight into its rows of one preallocated matrix, with
+        training rows first, so X_train and X_test are views (slices) of it.
+        Scaling statistics are computed column by column and applied in place.
+        Produces the same split and values as prepare_features + split_data +
+        scale_features. Returns (X_train, X_test, y_train, y_test) as arrays.
+        """
+        if self.multi_hot:
+            raise ValueError("The in-place path does not support multi-hot mode")
+        
+        print("\nPreparing features in place...")
+        feature_cols = [col for col in df.columns if col != 'churn']
+        categorical_cols = df[feature_cols].select_dtypes(include=CATEGORICAL_DTYPES).columns.tolist()
+        y = df['churn'].to_numpy()
+        
+        # Stratified split as index arrays; same permutation as split_data
+        train_idx, test_idx = train_test_split(
+            np.arange(len(df)), test_size=test_size, random_state=random_state, stratify=y
+        )
+        n_train = len(train_idx)
+        # Destination row of every source row: training rows first, in split order
+        destination = np.empty(len(df), dtype=np.int64)
+        destination[train_idx] = np.arange(n_train)
+        destination[test_idx] = np.arange(n_train, len(df))
+        
+        dtype = np.float32 if self.compact else np.float64
+        X = np.empty((len(df), len(feature_cols)), dtype=dtype)
+        for idx, col in enumerate(feature_cols):
+            if col in categorical_cols:
+                encoder = CategoryEncoder()
+                X[destination, idx] = encoder.fit_transform(df[col])
+                self.label_encoders[col] = encoder
+            else:
+                X[destination, idx] = pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy()
+        self.feature_names = feature_cols
+        
+        X_train, X_test = X[:n_train], X[n_train:]
+        means = np.empty(len(feature_cols))
+        variances = np.empty(len(feature_cols))
+        for idx in range(len(feature_cols)):
+            column = X_train[:, idx]
+            means[idx] = column.mean(dtype=np.float64)
+            variances[idx] = column.var(dtype=np.float64)
+        
+        self.scaler = StandardScaler()
+        self.scaler.mean_ = means
+        self.scaler.var_ = variances
+        self.scaler.scale_ = np.where(variances > 0, np.sqrt(variances), 1.0)
+        self.scaler.n_samples_seen_ = n_train
+        self.scaler.n_features_in_ = len(feature_cols)
+        self.scaler.feature_names_in_ = np.array(feature_cols, dtype=object)
+        X -= self.scaler.mean_.astype(dtype)
+        X /= self.scaler.scale_.astype(dtype)
+        
+        print(f"Feature matrix: {X.shape} {X.dtype}, {X.nbytes / 1e6:.2f} MB (train/test are views)")
+        print(f"Train set: {n_train} samples")
+        print(f"Test set: {len(test_idx)} samples")
+        
+        return X_train, X_test, y[train_idx], y[test_idx]
+    
     def split_data(self, X, y, test_size=0.2, random_state=42):
         """Split data into train and test sets"""
         print(f"\nSplitting data (test_size={test_size})...")
@@ -144,8 +900,21 @@ class SpotifyDataPreprocessor:
     def scale_features(self, X_train, X_test):
         """Scale features using StandardScaler"""
         print("\nScaling features...")
+        if sp.issparse(X_train):
+            # Centering would densify the matrix, so sparse features are only scaled
+            self.scaler = StandardScaler(with_mean=False)
+            return self.scaler.fit_transform(X_train), self.scaler.transform(X_test)
+        
+        if self.compact:
+            # StandardScaler preserves float32 input, halving the scaled matrices
+            X_train, X_test = X_train.astype(np.float32), X_test.astype(np.float32)
+        
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
+        if self.compact:
+            float64_mb = (X_train_scaled.size + X_test_scaled.size) * 8 / 1e6
+            print(f"Compact dtypes: scaled features {float64_mb:.2f} MB (float64) -> "
+                  f"{(X_train_scaled.nbytes + X_test_scaled.nbytes) / 1e6:.2f} MB (float32)")
         
         # Convert back to DataFrame
         X_train_scaled = pd.DataFrame(X_train_scaled, columns=X_train.columns, index=X_train.index)
@@ -153,12 +922,224 @@ class SpotifyDataPreprocessor:
         
         return X_train_scaled, X_test_scaled
     
+    def _prepare_chunk(self, chunk):
+        """Label churn and fill missing values on a raw chunk without logging"""
+        # Shallow copy: columns are replaced, never modified in place
+        chunk = fill_missing_values(chunk.copy(deep=False))
+        chunk['churn'] = evaluate_churn_rules(chunk, self.churn_rules)
+        return chunk
+    
+    def partial_fit(self, chunk, categorical_cols=None):
+        """
+        Update label vocabularies and scaler statistics from one raw data chunk.
+        Categorical columns accumulate per-category counts, from which the
+        mean and variance of their label codes follow exactly once the
+        vocabulary is final. Numeric columns keep running moments.
+        """
+        if self.multi_hot:
+            raise ValueError("Streaming fit does not support multi-hot mode")
+        
+        chunk = self._prepare_chunk(chunk)
+        
+        if self.feature_names is None:
+            self.feature_names = [col for col in chunk.columns if col != 'churn']
+            if categorical_cols is None:
+                categorical_cols = chunk[self.feature_names].select_dtypes(include=CATEGORICAL_DTYPES).columns.tolist()
+            self._categorical_cols = list(categorical_cols)
+        
+        for col in self.feature_names:
+            if col in self._categorical_cols:
+                counts = _as_category_strings(chunk[col]).value_counts()
+                if col in self._category_counts:
+                    counts = self._category_counts[col].add(counts, fill_value=0)
+                self._category_counts[col] = counts
+            else:
+                values = pd.to_numeric(chunk[col], errors='coerce').fillna(0).to_numpy(dtype=float)
+                self._numeric_moments[col] = _merge_moments(
+                    self._numeric_moments.get(col, (0, 0.0, 0.0)),
+                    (len(values), values.mean() if len(values) else 0.0, ((values - values.mean()) ** 2).sum() if len(values) else 0.0)
+                )
+        
+        self._n_seen += len(chunk)
+        return self
+    
+    def finalize_fit(self):
+        """Build label encoders and scaler parameters from the streamed statistics"""
+        if self._n_seen == 0:
+            raise ValueError("partial_fit must be called on at least one chunk before finalize_fit")
+        
+        means = np.zeros(len(self.feature_names))
+        variances = np.zeros(len(self.feature_names))
+        
+        for idx, col in enumerate(self.feature_names):
+            if col in self._categorical_cols:
+                counts = self._category_counts[col].sort_index()
+                self.label_encoders[col] = CategoryEncoder.from_classes(counts.index)
+                
+                # Label code of each category is its position in the sorted vocabulary
+                codes = np.arange(len(counts), dtype=float)
+                weights = counts.to_numpy(dtype=float)
+                means[idx] = np.average(codes, weights=weights)
+                variances[idx] = np.average((codes - means[idx]) ** 2, weights=weights)
+            else:
+                n, mean, m2 = self._numeric_moments[col]
+                means[idx] = mean
+                variances[idx] = m2 / n if n else 0.0
+        
+        self.scaler = StandardScaler()
+        self.scaler.mean_ = means
+        self.scaler.var_ = variances
+        self.scaler.scale_ = np.where(variances > 0, np.sqrt(variances), 1.0)
+        self.scaler.n_samples_seen_ = self._n_seen
+        self.scaler.n_features_in_ = len(self.feature_names)
+        self.scaler.feature_names_in_ = np.array(self.feature_names, dtype=object)
+        
+        print(f"Streaming fit finalized: {self._n_seen} rows, {len(self.feature_names)} features")
+        return self
+    
+    def transform(self, chunk):
+        """
+        Encode and scale one raw data chunk with the fitted vocabularies.
+        Categories not seen during fitting map to the encoder's unknown_value.
+        Only the selected features are computed when the feature set was pruned.
+        Returns (X_scaled, y).
+        """
+        chunk = self._prepare_chunk(chunk)
+        
+        features = self.selected_features or self.feature_names
+        positions = self.feature_positions()
+        X = np.empty((len(chunk), len(features)), dtype=float)
+        for idx, col in enumerate(features):
+            if col in self.label_encoders:
+                X[:, idx] = self.label_encoders[col].transform(chunk[col])
+            else:
+                X[:, idx] = pd.to_numeric(chunk[col], errors='coerce').fillna(0).to_numpy(dtype=float)
+        
+        X -= self.scaler.mean_[positions]
+        X /= self.scaler.scale_[positions]
+        
+        X_scaled = pd.DataFrame(X, columns=features, index=chunk.index)
+        return X_scaled, chunk['churn']
+    
+    def feature_positions(self):
+        """Column positions of the model inputs (the selected features) in the full feature matrix"""
+        if self.selected_features is None:
+            return np.arange(len(self.feature_names))
+        positions = {col: idx for idx, col in enumerate(self.feature_names)}
+        return np.array([positions[col] for col in self.selected_features])
+    
+    def fit_transform_chunks(self, chunk_source):
+        """
+        Fit on a stream of raw chunks, then yield (X_scaled, y) per chunk.
+        chunk_source is a zero-argument callable returning a fresh chunk iterator,
+        e.g. lambda: iter_data_chunks(path), since the data is read twice.
+        """
+        for chunk in chunk_source():
+            self.partial_fit(chunk)
+        self.finalize_fit()
+        
+        for chunk in chunk_source():
+            yield self.transform(chunk)
+    
+    def incremental_update(self, df, state_dir=INCREMENTAL_STATE_DIR, test_size=0.2):
+        """
+        Refresh the encoded dataset from a new export, processing only the delta.
+        Rows are matched to the previous run by fingerprint: rows that vanished
+        are dropped, new or changed rows are labeled, encoded and appended, and
+        unseen categories extend the vocabularies instead of forcing a refit.
+        Rows are assigned to the test set by fingerprint so their split is stable
+        across runs. Returns (X_train_scaled, X_test_scaled, y_train, y_test).
+        """
+        if self.multi_hot:
+            raise ValueError("Incremental mode does not support multi-hot mode")
+        
+        print("\nIncremental preprocessing...")
+        fingerprints = row_fingerprints(df)
+        state_path = os.path.join(state_dir, 'state.pkl')
+        
+        if os.path.exists(state_path):
+            with open(state_path, 'rb') as f:
+                state = pickle.load(f)
+            self.label_encoders = state['label_encoders']
+            self.feature_names = state['feature_names']
+            generation = state.get('generation', 0)
+            arrays = state.get('arrays', {name: f'{name}.npy' for name in ('fingerprints', 'X_encoded', 'y')})
+            old_fingerprints = np.load(os.path.join(state_dir, arrays['fingerprints']))
+            X_encoded = np.load(os.path.join(state_dir, arrays['X_encoded']))
+            y = np.load(os.path.join(state_dir, arrays['y']))
+            
+            keep = np.isin(old_fingerprints, fingerprints)
+            is_new = ~np.isin(fingerprints, old_fingerprints)
+            print(f"  Kept: {keep.sum()} rows, dropped: {(~keep).sum()}, new: {is_new.sum()}")
+            old_fingerprints, X_encoded, y = old_fingerprints[keep], X_encoded[keep], y[keep]
+        else:
+            print("  No previous state found, encoding all rows")
+            generation = 0
+            old_fingerprints = np.empty(0, dtype=np.uint64)
+            X_encoded = None
+            y = np.empty(0, dtype=np.int8)
+            is_new = np.ones(len(df), dtype=bool)
+        
+        new_rows = self._prepare_chunk(df[is_new])
+        if self.feature_names is None:
+            self.feature_names = [col for col in new_rows.columns if col != 'churn']
+            categorical_cols = new_rows[self.feature_names].select_dtypes(include=CATEGORICAL_DTYPES).columns
+            self.label_encoders = {col: CategoryEncoder().fit(new_rows[col]) for col in categorical_cols}
+        
+        X_new = np.empty((len(new_rows), len(self.feature_names)), dtype=np.float32)
+        for idx, col in enumerate(self.feature_names):
+            if col in self.label_encoders:
+                added = self.label_encoders[col].extend(new_rows[col])
+                if added and X_encoded is not None:
+                    print(f"  Extended vocabulary: {col} (+{len(added)} categories)")
+                X_new[:, idx] = self.label_encoders[col].transform(new_rows[col])
+            else:
+                X_new[:, idx] = pd.to_numeric(new_rows[col], errors='coerce').fillna(0).to_numpy()
+        
+        fingerprints = np.concatenate([old_fingerprints, fingerprints[is_new]])
+        X_encoded = X_new if X_encoded is None else np.vstack([X_encoded, X_new])
+        y = np.concatenate([y, new_rows['churn'].to_numpy(dtype=np.int8)])
+        
+        # Persist state for the next run: the arrays under new generation names,
+        # then state.pkl (renamed into place) pointing at them, so an interrupted
+        # run leaves the previous state intact
+        os.makedirs(state_dir, exist_ok=True)
+        generation += 1
+        arrays = {name: f'{name}.{generation}.npy' for name in ('fingerprints', 'X_encoded', 'y')}
+        for name, array in (('fingerprints', fingerprints), ('X_encoded', X_encoded), ('y', y)):
+            np.save(os.path.join(state_dir, arrays[name]), array)
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'label_encoders': self.label_encoders, 'feature_names': self.feature_names,
+                         'generation': generation, 'arrays': arrays}, f)
+        os.replace(tmp_path, state_path)
+        # Drop the arrays of earlier generations
+        for name in os.listdir(state_dir):
+            if name.endswith('.npy') and name not in arrays.values():
+                os.remove(os.path.join(state_dir, name))
+        
+        is_test = (fingerprints % np.uint64(1000)) < int(test_size * 1000)
+        X_train = pd.DataFrame(X_encoded[~is_test], columns=self.feature_names)
+        X_test = pd.DataFrame(X_encoded[is_test], columns=self.feature_names)
+        print(f"Train set: {len(X_train)} samples")
+        print(f"Test set: {len(X_test)} samples")
+        
+        X_train_scaled, X_test_scaled = self.scale_features(X_train, X_test)
+        return X_train_scaled, X_test_scaled, pd.Series(y[~is_test], name='churn'), pd.Series(y[is_test], name='churn')
+    
     def save_preprocessor(self, filepath='preprocessor.pkl'):
         """Save preprocessor objects"""
         preprocessor_data = {
             'label_encoders': self.label_encoders,
             'scaler': self.scaler,
-            'feature_names': self.feature_names
+            'feature_names': self.feature_names,
+            'multi_hot_encoders': self.multi_hot_encoders,
+            'source_columns': self.source_columns,
+            'selected_features': self.selected_features,
+            # Category -> scaled value tables for microsecond single-row serving
+            'fused': None if self.multi_hot else FusedPreprocessor(
+                self.feature_names, self.label_encoders, self.scaler, self.selected_features
+            )
         }
         with open(filepath, 'wb') as f:
             pickle.dump(preprocessor_data, f)
@@ -168,47 +1149,76 @@ class SpotifyDataPreprocessor:
         """Load preprocessor objects"""
         with open(filepath, 'rb') as f:
             preprocessor_data = pickle.load(f)
-        self.label_encoders = preprocessor_data['label_encoders']
+        self.label_encoders = upgrade_label_encoders(preprocessor_data['label_encoders'])
         self.scaler = preprocessor_data['scaler']
         self.feature_names = preprocessor_data['feature_names']
+        self.multi_hot_encoders = preprocessor_data.get('multi_hot_encoders', {})
+        self.source_columns = preprocessor_data.get('source_columns')
+        self.selected_features = preprocessor_data.get('selected_features')
+        self.multi_hot = bool(self.multi_hot_encoders)
         print(f"Preprocessor loaded from {filepath}")
 
-def main():
+def main(multi_hot=False, incremental=False, n_jobs=1, file_path='Spotify_data.xlsx', compact=False, zero_copy=False):
     """Main preprocessing pipeline"""
-    preprocessor = SpotifyDataPreprocessor()
+    preprocessor = SpotifyDataPreprocessor(multi_hot=multi_hot, n_jobs=n_jobs, compact=compact)
     
     # Load data
-    df = preprocessor.load_data('Spotify_data.xlsx')
-    
-    # Create churn target
-    df = preprocessor.create_churn_target(df)
-    
-    # Handle missing values
-    df = preprocessor.handle_missing_values(df)
-    
-    # Prepare features
-    X, y = preprocessor.prepare_features(df)
+    df = preprocessor.load_data(file_path)
     
-    # Split data
-    X_train, X_test, y_train, y_test = preprocessor.split_data(X, y)
-    
-    # Scale features
-    X_train_scaled, X_test_scaled = preprocessor.scale_features(X_train, X_test)
+    if incremental:
+        # Label, encode and append only rows not seen in the previous run
+        X_train_scaled, X_test_scaled, y_train, y_test = preprocessor.incremental_update(df)
+    else:
+        # Create churn target
+        df = preprocessor.create_churn_target(df)
+        
+        # Handle missing values
+        df = preprocessor.handle_missing_values(df)
+        
+        if zero_copy:
+            # Encode, split and scale inside one preallocated matrix
+            X_train_scaled, X_test_scaled, y_train, y_test = preprocessor.prepare_features_inplace(df)
+        else:
+            # Prepare features
+            X, y = preprocessor.prepare_features(df)
+            
+            # Split data
+            X_train, X_test, y_train, y_test = preprocessor.split_data(X, y)
+            
+            # Scale features
+            X_train_scaled, X_test_scaled = preprocessor.scale_features(X_train, X_test)
     
     # Save processed data
-    X_train_scaled.to_csv('X_train.csv', index=False)
-    X_test_scaled.to_csv('X_test.csv', index=False)
-    y_train.to_csv('y_train.csv', index=False)
-    y_test.to_csv('y_test.csv', index=False)
+    save_processed_data(X_train_scaled, X_test_scaled, y_train, y_test, preprocessor.feature_names)
     
     # Save preprocessor
     preprocessor.save_preprocessor('preprocessor.pkl')
     
     print("\n[SUCCESS] Data preprocessing completed!")
-    print(f"Processed data saved: X_train.csv, X_test.csv, y_train.csv, y_test.csv")
+    print(f"Processed data saved: {PROCESSED_DATA_DIR}/ (.npy arrays + manifest.json)")
     
     return X_train_scaled, X_test_scaled, y_train, y_test, preprocessor
 
 if __name__ == '__main__':
-    main()
-
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Preprocess the Spotify dataset for churn prediction')
+    parser.add_argument('--input', default='Spotify_data.xlsx',
+                        help='Survey data file (.xlsx, .csv or .parquet)')
+    parser.add_argument('--multi-hot', action='store_true',
+                        help='Split multi-select survey columns into sparse multi-hot tokens')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'Only encode rows that changed since the last run (state in {INCREMENTAL_STATE_DIR}/)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Keep category/int8/float32 dtypes throughout and report memory savings')
+    parser.add_argument('--zero-copy', action='store_true',
+                        help='Encode, split and scale in one preallocated matrix (lowest peak memory)')
+    parser.add_argument('--n-jobs', type=int, default=1,
+                        help='Worker processes for categorical encoding (-1 = all cores)')
+    args = parser.parse_args()
+    
+    # Run via the importable module so pickled encoders reference
+    # data_preprocessing.CategoryEncoder rather than __main__
+    import data_preprocessing
+    data_preprocessing.main(multi_hot=args.multi_hot, incremental=args.incremental, n_jobs=args.n_jobs,
+                            file_path=args.input, compact=args.compact, zero_copy=args.zero_copy)
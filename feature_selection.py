@@ -0,0 +1,124 @@
+"""
+Feature Selection for Spotify Churn Prediction
+Ranks the encoded survey features by permutation or model importance and
+retrains on the top-k subsets, trading a little accuracy for less
+preprocessing and inference work per row.
+"""
+
+import math
+import warnings
+warnings.filterwarnings('ignore')
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+
+from model_training import build_model, measure_inference_cost
+
+FEATURE_SELECTION_RESULTS_PATH = 'feature_selection_results.csv'
+
+class FeatureSelector:
+    """
+    Importance-driven feature pruning.
+    A reference model is fitted on a stratified part of the training rows
+    and its features are ranked on the held-out rows, by the F1 drop when a
+    column is shuffled (method='permutation', ties broken by the model's own
+    importances) or by feature_importances_ alone (method='model'). The
+    model is then refitted on the top-k features for every k in k_values
+    (default: all, 3/4, 1/2, 1/4, ... of the features), and the smallest k
+    whose validation F1 is within tolerance of the full feature set is kept.
+    """
+    
+    def __init__(self, model_name='XGBoost', method='permutation', k_values=None, tolerance=0.01,
+                 validation_fraction=0.2, n_repeats=5, random_state=42):
+        if method not in ('permutation', 'model'):
+            raise ValueError(f"Unknown importance method: {method}")
+        self.model_name = model_name
+        self.method = method
+        self.k_values = k_values
+        self.tolerance = tolerance
+        self.validation_fraction = validation_fraction
+        self.n_repeats = n_repeats
+        self.random_state = random_state
+        self.importances_ = None
+        self.results_ = None
+        self.selected_features_ = None
+        self.selected_indices_ = None
+    
+    def _default_k_values(self, n_features):
+        k_values = {n_features, math.ceil(n_features * 3 / 4)}
+        k = n_features
+        while k > 1:
+            k = math.ceil(k / 2)
+            k_values.add(k)
+        return sorted(k_values, reverse=True)
+    
+    def rank(self, model, X_val, y_val):
+        """Importance per feature: (permutation F1 drop or None, model importance)"""
+        model_importance = np.asarray(getattr(model, 'feature_importances_', np.abs(np.ravel(getattr(model, 'coef_', 0)))))
+        if self.method == 'model':
+            return None, model_importance
+        X_dense = X_val.toarray() if sp.issparse(X_val) else np.asarray(X_val)
+        result = permutation_importance(model, X_dense, y_val, scoring='f1', n_repeats=self.n_repeats,
+                                        random_state=self.random_state)
+        return result.importances_mean, model_importance
+    
+    def fit(self, X, y, feature_names):
+        """Rank the features, evaluate every top-k subset and select one; returns self"""
+        y = np.asarray(y)
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X, y, test_size=self.validation_fraction, random_state=self.random_state, stratify=y
+        )
+        n_features = len(feature_names)
+        
+        model = build_model(self.model_name).fit(X_fit, y_fit)
+        permutation, model_importance = self.rank(model, X_val, y_val)
+        # Rank by permutation importance, then model importance
+        keys = (-model_importance,) if permutation is None else (-model_importance, -permutation)
+        order = np.lexsort(keys)
+        self.importances_ = pd.DataFrame(
+            {'permutation_f1_drop': permutation, 'model_importance': model_importance}, index=list(feature_names)
+        ).iloc[order]
+        
+        print(f"\nFeature ranking ({self.method} importance, {self.model_name}):")
+        for rank, (name, row) in enumerate(self.importances_.iterrows(), 1):
+            drop = '' if permutation is None else f"F1 drop {row['permutation_f1_drop']:+.4f}, "
+            print(f"  {rank:2d}. {name:<28} {drop}model importance {row['model_importance']:.4f}")
+        
+        records = []
+        print(f"\nRetraining {self.model_name} on top-k feature subsets:")
+        for k in self.k_values or self._default_k_values(n_features):
+            indices = np.sort(order[:k])
+            model_k = build_model(self.model_name).fit(X_fit[:, indices], y_fit)
+            f1 = f1_score(y_val, model_k.predict(X_val[:, indices]), zero_division=0)
+            cost = measure_inference_cost(model_k, X_val[:, indices])
+            records.append({
+                'k': k,
+                'f1_score': f1,
+                'predict_p99_ms': cost['predict_p99_ms'],
+                'throughput_rows_s': cost['throughput_rows_s'],
+                'features': ', '.join(feature_names[i] for i in indices),
+            })
+            print(f"  k={k:2d}: F1 {f1:.4f}, p99 {cost['predict_p99_ms']:.3f} ms, "
+                  f"{cost['throughput_rows_s']:,.0f} rows/s")
+        self.results_ = pd.DataFrame(records)
+        
+        full_f1 = self.results_.loc[self.results_['k'].idxmax(), 'f1_score']
+        adequate = self.results_[self.results_['f1_score'] >= full_f1 - self.tolerance]
+        k = int(adequate['k'].min())
+        self.selected_indices_ = np.sort(order[:k])
+        self.selected_features_ = [feature_names[i] for i in self.selected_indices_]
+        selected = self.results_[self.results_['k'] == k].iloc[0]
+        print(f"\nSelected {k} of {n_features} features (validation F1 {selected['f1_score']:.4f} vs "
+              f"{full_f1:.4f} with all, tolerance {self.tolerance})")
+        dropped = [name for name in feature_names if name not in self.selected_features_]
+        print(f"  Dropped: {', '.join(dropped) if dropped else 'none'}")
+        return self
+    
+    def save_results(self, filepath=FEATURE_SELECTION_RESULTS_PATH):
+        """Save the accuracy/latency tradeoff of every evaluated subset"""
+        self.results_.to_csv(filepath, index=False)
+        print(f"Saved: {filepath}")
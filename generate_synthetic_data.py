@@ -0,0 +1,205 @@
+"""
+Synthetic Data Generator for Spotify Churn Prediction
+This script generates large, realistic survey datasets for scale testing.
+The column schema comes from the dataset metadata, the value sets and their
+dependencies from the bundled workbook.
+"""
+
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_preprocessing import read_excel_cached
+
+class SyntheticSurveyGenerator:
+    """
+    Sample survey rows from a Chow-Liu tree fitted to the workbook.
+    Each column is conditioned on the earlier column it shares the most
+    mutual information with, so the pairwise joint frequencies of the
+    original survey are preserved while new answer combinations can still
+    occur (controlled by the smoothing parameter alpha).
+    """
+    
+    def __init__(self, alpha=0.1, seed=42):
+        self.alpha = alpha
+        self.seed = seed
+        self.columns = None
+        self.values = {}
+        self.parents = {}
+        self.order = []
+        self.cdfs = {}
+    
+    def load_schema(self, metadata_path='spotify-user-behavior-dataset-metadata.json'):
+        """Read the ordered column list from the dataset metadata description"""
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        self.columns = re.findall(r'^\s*\d+\)\s*(\w+)\s+-', metadata.get('description', ''), flags=re.MULTILINE)
+        if not self.columns:
+            raise ValueError(f"No column schema found in {metadata_path}")
+        print(f"Schema: {len(self.columns)} columns from {metadata_path}")
+        return self.columns
+    
+    def fit(self, df):
+        """Learn value sets, the dependency tree and conditional distributions"""
+        if self.columns is None:
+            self.columns = df.columns.tolist()
+        
+        # Value codes per column; missing answers get their own trailing state
+        codes = {}
+        for col in self.columns:
+            col_codes, uniques = pd.factorize(df[col], use_na_sentinel=True)
+            self.values[col] = np.append(np.asarray(uniques, dtype=object), None)
+            col_codes[col_codes < 0] = len(uniques)
+            codes[col] = col_codes
+        
+        # Maximum spanning tree over pairwise mutual information (Prim)
+        mutual_info = {}
+        for i, a in enumerate(self.columns):
+            for b in self.columns[i + 1:]:
+                mutual_info[a, b] = mutual_info[b, a] = self._mutual_information(codes[a], codes[b])
+        
+        self.order = [self.columns[0]]
+        self.parents = {self.columns[0]: None}
+        remaining = set(self.columns[1:])
+        while remaining:
+            parent, child = max(
+                ((p, c) for p in self.order for c in remaining),
+                key=lambda pair: mutual_info[pair]
+            )
+            self.parents[child] = parent
+            self.order.append(child)
+            remaining.remove(child)
+        
+        # Smoothed (conditional) cumulative distributions
+        for col in self.order:
+            n_values = len(self.values[col])
+            parent = self.parents[col]
+            if parent is None:
+                counts = np.bincount(codes[col], minlength=n_values)[None, :]
+            else:
+                counts = np.zeros((len(self.values[parent]), n_values))
+                np.add.at(counts, (codes[parent], codes[col]), 1)
+            probs = self._smooth(counts, codes[col], n_values)
+            self.cdfs[col] = np.cumsum(probs, axis=1)
+        
+        print(f"Fitted dependency tree on {len(df)} rows (alpha={self.alpha})")
+        return self
+    
+    def _smooth(self, counts, col_codes, n_values):
+        """Additive smoothing towards the column marginal, never towards unseen values"""
+        marginal = np.bincount(col_codes, minlength=n_values).astype(float)
+        marginal /= marginal.sum()
+        smoothed = counts + self.alpha * marginal
+        return smoothed / smoothed.sum(axis=1, keepdims=True)
+    
+    @staticmethod
+    def _mutual_information(a, b):
+        joint = pd.crosstab(a, b).to_numpy(dtype=float)
+        joint = joint / joint.sum()
+        outer = joint.sum(axis=1, keepdims=True) @ joint.sum(axis=0, keepdims=True)
+        nonzero = joint > 0
+        return float((joint[nonzero] * np.log(joint[nonzero] / outer[nonzero])).sum())
+    
+    def sample(self, n_rows, rng):
+        """Draw n_rows synthetic survey rows as a DataFrame in schema order"""
+        codes = {}
+        for col in self.order:
+            parent = self.parents[col]
+            u = rng.random(n_rows)
+            if parent is None:
+                codes[col] = np.searchsorted(self.cdfs[col][0], u, side='right')
+            else:
+                # One CDF lookup per parent value, so memory stays O(n_rows)
+                codes[col] = np.empty(n_rows, dtype=np.intp)
+                for parent_code in np.unique(codes[parent]):
+                    rows = np.flatnonzero(codes[parent] == parent_code)
+                    codes[col][rows] = np.searchsorted(self.cdfs[col][parent_code], u[rows], side='right')
+            # Guard against floating point round-off at the top of the CDF
+            np.minimum(codes[col], len(self.values[col]) - 1, out=codes[col])
+        
+        data = {}
+        for col in self.columns:
+            values = self.values[col][codes[col]]
+            non_missing = self.values[col][:-1]
+            if len(non_missing) and all(isinstance(v, (int, np.integer)) for v in non_missing) \
+                    and not (codes[col] == len(non_missing)).any():
+                values = values.astype(np.int64)
+            data[col] = values
+        return pd.DataFrame(data)
+    
+    def write(self, output_path, n_rows, chunksize=1_000_000):
+        """
+        Write n_rows synthetic rows in chunks to CSV, Parquet or Excel
+        (chosen by extension). Excel is limited to 1,048,575 data rows.
+        """
+        ext = os.path.splitext(output_path)[1].lower()
+        if ext == '.xlsx' and n_rows > 1_048_575:
+            raise ValueError("Excel workbooks hold at most 1,048,575 data rows; use .csv or .parquet")
+        
+        rng = np.random.default_rng(self.seed)
+        start_time = time.time()
+        written = 0
+        parquet_writer = None
+        excel_chunks = []
+        
+        try:
+            while written < n_rows:
+                chunk = self.sample(min(chunksize, n_rows - written), rng)
+                if ext == '.csv':
+                    chunk.to_csv(output_path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+                elif ext == '.parquet':
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if parquet_writer is None:
+                        parquet_writer = pq.ParquetWriter(output_path, table.schema)
+                    parquet_writer.write_table(table)
+                elif ext == '.xlsx':
+                    excel_chunks.append(chunk)
+                else:
+                    raise ValueError(f"Unsupported output format: {ext}")
+                written += len(chunk)
+                print(f"  {written:,}/{n_rows:,} rows ({time.time() - start_time:.1f}s)")
+        finally:
+            if parquet_writer is not None:
+                parquet_writer.close()
+        
+        if excel_chunks:
+            pd.concat(excel_chunks, ignore_index=True).to_excel(output_path, index=False)
+        
+        print(f"Saved: {output_path}")
+        return output_path
+
+def main(n_rows=1_000_000, output_path='synthetic_spotify_data.parquet', chunksize=1_000_000, seed=42, alpha=0.1):
+    """Main generation pipeline"""
+    print("="*60)
+    print("SPOTIFY CHURN PREDICTION - SYNTHETIC DATA GENERATION")
+    print("="*60)
+    
+    generator = SyntheticSurveyGenerator(alpha=alpha, seed=seed)
+    columns = generator.load_schema()
+    df = read_excel_cached('Spotify_data.xlsx', columns=columns)
+    generator.fit(df)
+    generator.write(output_path, n_rows, chunksize=chunksize)
+    
+    print("\n[SUCCESS] Synthetic data generation completed!")
+    return generator
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate a synthetic Spotify survey dataset for scale testing')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Number of rows to generate')
+    parser.add_argument('--output', default='synthetic_spotify_data.parquet',
+                        help='Output file (.parquet, .csv or .xlsx)')
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help='Rows generated and written per chunk')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible datasets')
+    parser.add_argument('--alpha', type=float, default=0.1,
+                        help='Smoothing towards column marginals (0 = only observed answer pairs)')
+    args = parser.parse_args()
+    
+    main(args.rows, args.output, args.chunksize, args.seed, args.alpha)
@@ -0,0 +1,145 @@
+"""
+Model Evaluation for Spotify Churn Prediction
+Computes all evaluation metrics and curves in a single (optionally
+streamed) pass, and persists ROC/PR curve points, confusion matrices and
+feature importances as one compact array file for the app's plots.
+"""
+
+import numpy as np
+
+EVALUATION_DATA_PATH = 'model_evaluation.npz'
+
+class MetricsAccumulator:
+    """
+    Single-pass binary classification metrics over (y_true, score) chunks.
+    Threshold metrics (accuracy, precision, recall, F1) all derive from one
+    running confusion count. ROC-AUC and the ROC/PR curves come from a
+    single sort of the scores; once more than max_exact rows have been seen,
+    scores are folded into n_bins fixed-width histograms per class instead,
+    which keeps memory constant (AUC is then exact up to ties within a bin).
+    """
+    
+    def __init__(self, threshold=0.5, n_bins=10_000, max_exact=10_000_000):
+        self.threshold = threshold
+        self.n_bins = n_bins
+        self.max_exact = max_exact
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+        self._scores = []
+        self._labels = []
+        self._n_rows = 0
+        self._histogram = None
+    
+    def update(self, y_true, y_score, y_pred=None):
+        """
+        Add one chunk of labels and positive-class scores. y_pred defaults to
+        score > threshold, which is how the candidate models' predict() decides.
+        """
+        y_true = np.asarray(y_true).astype(bool)
+        y_score = np.asarray(y_score, dtype=np.float64)
+        y_pred = y_score > self.threshold if y_pred is None else np.asarray(y_pred).astype(bool)
+        self.confusion += np.bincount(2 * y_true + y_pred, minlength=4).reshape(2, 2)
+        
+        self._n_rows += len(y_true)
+        if self._histogram is None:
+            self._scores.append(y_score)
+            self._labels.append(y_true)
+            if self._n_rows > self.max_exact:
+                self._histogram = np.zeros((2, self.n_bins), dtype=np.int64)
+                for labels, scores in zip(self._labels, self._scores):
+                    self._add_to_histogram(labels, scores)
+                self._scores, self._labels = [], []
+        else:
+            self._add_to_histogram(y_true, y_score)
+        return self
+    
+    def _add_to_histogram(self, y_true, y_score):
+        bins = np.clip((y_score * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+        self._histogram[0] += np.bincount(bins[~y_true], minlength=self.n_bins)
+        self._histogram[1] += np.bincount(bins[y_true], minlength=self.n_bins)
+    
+    def _cumulative_counts(self):
+        """(false positives, true positives) at each distinct threshold, from the highest score down"""
+        if self._histogram is None:
+            scores = np.concatenate(self._scores) if self._scores else np.empty(0)
+            labels = np.concatenate(self._labels) if self._labels else np.empty(0, dtype=bool)
+            order = np.argsort(scores, kind='mergesort')[::-1]
+            scores, labels = scores[order], labels[order]
+            ends = np.r_[np.flatnonzero(np.diff(scores)), len(labels) - 1]
+            tps = np.cumsum(labels)[ends]
+            return 1 + ends - tps, tps
+        negatives, positives = self._histogram[0][::-1], self._histogram[1][::-1]
+        occupied = (negatives + positives) > 0
+        return np.cumsum(negatives)[occupied], np.cumsum(positives)[occupied]
+    
+    def metrics(self):
+        """Metrics dict in ChurnModelTrainer.calculate_metrics form, plus the curve points under 'curves'"""
+        (tn, fp), (fn, tp) = self.confusion
+        n_pos, n_neg = tp + fn, tn + fp
+        
+        fps, tps = self._cumulative_counts() if self._n_rows else (np.empty(0, np.int64), np.empty(0, np.int64))
+        
+        # Precision/recall per threshold, by increasing threshold and ending at (recall 0, precision 1)
+        predicted = tps + fps
+        precision = np.divide(tps, predicted, out=np.zeros(len(tps)), where=predicted > 0)
+        recall = tps / max(n_pos, 1)
+        
+        # ROC without collinear interior points, which add nothing to the plot or the area
+        if len(fps) > 2:
+            keep = np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True]
+            fps, tps = fps[keep], tps[keep]
+        fpr = np.r_[0, fps] / max(n_neg, 1)
+        tpr = np.r_[0, tps] / max(n_pos, 1)
+        roc_auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)) if n_pos and n_neg else 0.0
+        
+        return {
+            'accuracy': (tp + tn) / self._n_rows if self._n_rows else 0.0,
+            'precision': tp / (tp + fp) if tp + fp else 0.0,
+            'recall': tp / n_pos if n_pos else 0.0,
+            'f1_score': 2 * tp / (2 * tp + fp + fn) if tp else 0.0,
+            'roc_auc': roc_auc,
+            'confusion_matrix': self.confusion.copy(),
+            'curves': {
+                'roc_fpr': fpr,
+                'roc_tpr': tpr,
+                'pr_precision': np.r_[precision[::-1], 1.0],
+                'pr_recall': np.r_[recall[::-1], 0.0],
+            },
+        }
+
+def _key(model_name):
+    return model_name.lower().replace(' ', '_')
+
+def save_evaluation_data(results, feature_names, filepath=EVALUATION_DATA_PATH):
+    """
+    Save per-model curve points, confusion matrix and (for tree models)
+    feature importances from ChurnModelTrainer.results.
+    """
+    arrays = {
+        'model_names': np.array(list(results)),
+        'feature_names': np.array(list(feature_names)),
+    }
+    for model_name, result in results.items():
+        key = _key(model_name)
+        for name, points in result['metrics']['curves'].items():
+            arrays[f'{key}__{name}'] = np.asarray(points, dtype=np.float32)
+        arrays[f'{key}__confusion_matrix'] = np.asarray(result['metrics']['confusion_matrix'], dtype=np.int64)
+        if result.get('feature_importance') is not None:
+            arrays[f'{key}__feature_importance'] = np.asarray(result['feature_importance'], dtype=np.float32)
+    
+    np.savez_compressed(filepath, **arrays)
+    print(f"Saved: {filepath}")
+
+def load_evaluation_data(filepath=EVALUATION_DATA_PATH):
+    """
+    Load the saved evaluation data as (feature_names, {model_name: {array_name: array}}),
+    e.g. curves['XGBoost']['roc_fpr'].
+    """
+    with np.load(filepath, allow_pickle=False) as data:
+        feature_names = data['feature_names'].tolist()
+        curves = {}
+        for model_name in data['model_names'].tolist():
+            prefix = f'{_key(model_name)}__'
+            curves[model_name] = {
+                name[len(prefix):]: data[name] for name in data.files if name.startswith(prefix)
+            }
+    return feature_names, curves
@@ -0,0 +1,229 @@
+"""
+Model Search Script for Spotify Churn Prediction
+Selects hyperparameters for every candidate model family with stratified
+k-fold cross-validation and successive halving.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import time
+import warnings
+warnings.filterwarnings('ignore')
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+from model_training import MODEL_DEFAULTS, build_model
+
+# Hyperparameter grids searched for each model family
+SEARCH_SPACES = {
+    'Logistic Regression': {
+        'C': [0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0],
+    },
+    'Random Forest': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [4, 6, 10, None],
+        'min_samples_leaf': [1, 2, 5],
+    },
+    'XGBoost': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [3, 4, 6],
+        'learning_rate': [0.03, 0.1, 0.3],
+        'subsample': [0.8, 1.0],
+    },
+}
+
+# Per-process state of search workers: shared data and fold matrix cache
+_worker_data = {}
+
+def _init_worker(data_path, y_path, folds):
+    """Worker initializer: open the shared dataset once per process"""
+    if data_path.endswith('.npz'):
+        _worker_data['X'] = sp.load_npz(data_path).tocsr()
+    else:
+        _worker_data['X'] = np.load(data_path, mmap_mode='r')
+    _worker_data['y'] = np.load(y_path, mmap_mode='r')
+    _worker_data['folds'] = folds
+    _worker_data['cache'] = {}
+
+def _fold_matrices(fold, n_samples):
+    """Materialize (and cache) the training/validation matrices of one fold at one budget"""
+    cache = _worker_data['cache']
+    key = (fold, n_samples)
+    if key not in cache:
+        # Budgets only grow between rungs, so smaller cached matrices are stale
+        for old_key in [k for k in cache if k[1] != n_samples]:
+            del cache[old_key]
+        train_idx, val_idx = _worker_data['folds'][fold]
+        train_idx = np.sort(train_idx[:n_samples])
+        X, y = _worker_data['X'], _worker_data['y']
+        cache[key] = (X[train_idx], y[train_idx], X[val_idx], y[val_idx])
+    return cache[key]
+
+def _stratified_order(train_idx, y, rng):
+    """
+    Shuffle a fold's training indices so that every prefix is a stratified
+    subsample: rows of each class are spread evenly along the order, so a
+    prefix of any length holds each class within one row of its share.
+    """
+    position = np.empty(len(train_idx))
+    for label in np.unique(y[train_idx]):
+        members = np.flatnonzero(y[train_idx] == label)
+        members = rng.permutation(members)
+        position[members] = (np.arange(len(members)) + rng.random()) / len(members)
+    return train_idx[np.argsort(position, kind='stable')]
+
+def _evaluate_task(model_name, params, fold, n_samples):
+    """Worker: fit one configuration on one fold's (subsampled) training rows, return validation F1"""
+    X_train, y_train, X_val, y_val = _fold_matrices(fold, n_samples)
+    model = build_model(model_name, params, n_jobs=1)
+    model.fit(X_train, y_train)
+    return f1_score(y_val, model.predict(X_val), zero_division=0)
+
+class SuccessiveHalvingSearch:
+    """
+    Cross-validated hyperparameter search with successive halving.
+    Every family starts with n_candidates configurations evaluated on small
+    stratified subsamples of each fold's training rows; after every rung
+    only the best 1/eta of each family survive and the row budget grows by
+    eta, until the finalists are scored on full folds. (configuration, fold)
+    tasks run in parallel worker processes that share one memory-mapped
+    copy of the data and cache the fold matrices of the current rung.
+    """
+    
+    def __init__(self, search_spaces=None, n_splits=5, n_candidates=12, eta=3,
+                 min_samples=100, n_jobs=-1, random_state=42):
+        self.search_spaces = search_spaces or SEARCH_SPACES
+        self.n_splits = n_splits
+        self.n_candidates = n_candidates
+        self.eta = eta
+        self.min_samples = min_samples
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.results_ = None
+        self.best_params_ = {}
+        self.best_scores_ = {}
+    
+    def _sample_candidates(self, rng):
+        """Draw up to n_candidates grid points per family, always including the defaults (once)"""
+        candidates = {}
+        for model_name, space in self.search_spaces.items():
+            # Effective defaults, including the estimator's own (e.g. LogisticRegression's C=1.0)
+            defaults = build_model(model_name).get_params()
+            grid = [params for params in ParameterGrid(space) if {**defaults, **params} != defaults]
+            picks = rng.choice(len(grid), size=min(self.n_candidates - 1, len(grid)), replace=False)
+            configs = [{}] + [grid[i] for i in sorted(picks)]
+            candidates[model_name] = configs
+        return candidates
+    
+    def _budgets(self, n_train):
+        """
+        Row budgets per rung: geometric in eta, ending at the full fold size.
+        Rungs below min_samples are dropped rather than clamped, so the budget
+        still grows by eta between the remaining rungs.
+        """
+        n_rungs = max(1, math.ceil(math.log(self.n_candidates, self.eta)))
+        budgets = [int(n_train / self.eta ** (n_rungs - 1 - rung)) for rung in range(n_rungs)]
+        return [budget for budget in budgets if budget >= self.min_samples] or [n_train]
+    
+    def fit(self, X, y):
+        """Run the search on X, y and return self"""
+        y = np.asarray(y)
+        rng = np.random.default_rng(self.random_state)
+        skf = StratifiedKFold(n_splits=self.n_splits, shuffle=True, random_state=self.random_state)
+        # Shuffled training indices per fold; a prefix of each is a stratified subsample
+        folds = [(_stratified_order(train_idx, y, rng), val_idx)
+                 for train_idx, val_idx in skf.split(np.zeros(len(y)), y)]
+        budgets = self._budgets(min(len(train_idx) for train_idx, _ in folds))
+        candidates = self._sample_candidates(rng)
+        n_workers = os.cpu_count() if self.n_jobs in (None, -1) else self.n_jobs
+        
+        total = sum(len(c) for c in candidates.values())
+        print(f"\nSearching {total} configurations, {self.n_splits}-fold CV, row budgets {budgets}")
+        
+        tmp_dir = tempfile.mkdtemp(prefix='churn_search_')
+        try:
+            data_path, y_path = self._share_data(X, y, tmp_dir)
+            records = []
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(data_path, y_path, folds)) as executor:
+                for rung, n_samples in enumerate(budgets):
+                    start_time = time.time()
+                    tasks = [
+                        (model_name, idx, fold)
+                        for model_name, configs in candidates.items()
+                        for idx in range(len(configs))
+                        for fold in range(self.n_splits)
+                    ]
+                    # Group tasks by fold so each worker reuses its cached fold matrices
+                    tasks.sort(key=lambda task: task[2])
+                    futures = [
+                        executor.submit(_evaluate_task, model_name, candidates[model_name][idx], fold, n_samples)
+                        for model_name, idx, fold in tasks
+                    ]
+                    scores = {}
+                    for (model_name, idx, fold), future in zip(tasks, futures):
+                        scores.setdefault((model_name, idx), []).append(future.result())
+                    
+                    survivors = {}
+                    for model_name, configs in candidates.items():
+                        ranked = sorted(range(len(configs)), key=lambda i: -np.mean(scores[model_name, i]))
+                        for i in range(len(configs)):
+                            records.append({
+                                'model': model_name,
+                                'params': configs[i],
+                                'rung': rung,
+                                'n_samples': n_samples,
+                                'mean_f1': float(np.mean(scores[model_name, i])),
+                                'std_f1': float(np.std(scores[model_name, i])),
+                            })
+                        keep = max(1, math.ceil(len(configs) / self.eta))
+                        survivors[model_name] = [configs[i] for i in ranked[:keep]]
+                    
+                    print(f"  Rung {rung}: {len(tasks)} fits on {n_samples} rows per fold "
+                          f"({time.time() - start_time:.1f}s), kept "
+                          + ", ".join(f"{name}: {len(c)}" for name, c in survivors.items()))
+                    if rung < len(budgets) - 1:
+                        candidates = survivors
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        
+        self.results_ = pd.DataFrame(records)
+        final = self.results_[self.results_['rung'] == len(budgets) - 1]
+        for model_name, group in final.groupby('model', sort=False):
+            best = group.sort_values('mean_f1', ascending=False).iloc[0]
+            self.best_params_[model_name] = best['params']
+            self.best_scores_[model_name] = (best['mean_f1'], best['std_f1'])
+            print(f"  Best {model_name}: F1 {best['mean_f1']:.4f} +/- {best['std_f1']:.4f} with "
+                  f"{ {**MODEL_DEFAULTS[model_name], **best['params']} }")
+        return self
+    
+    @staticmethod
+    def _share_data(X, y, tmp_dir):
+        """Return file paths the workers can open; memory-mapped inputs are reused in place"""
+        if sp.issparse(X):
+            data_path = os.path.join(tmp_dir, 'X.npz')
+            sp.save_npz(data_path, sp.csr_matrix(X), compressed=False)
+        elif isinstance(X, np.memmap) and X.filename and X.filename.endswith('.npy'):
+            data_path = X.filename
+        else:
+            data_path = os.path.join(tmp_dir, 'X.npy')
+            np.save(data_path, np.asarray(X))
+        y_path = os.path.join(tmp_dir, 'y.npy')
+        np.save(y_path, y)
+        return data_path, y_path
+    
+    def best_model_name(self):
+        """Family with the highest cross-validated F1 among the finalists"""
+        return max(self.best_scores_, key=lambda name: self.best_scores_[name][0])
+    
+    def save_results(self, filepath='model_search_results.csv'):
+        """Save every evaluated configuration and its CV scores"""
+        self.results_.to_csv(filepath, index=False)
+        print(f"Saved: {filepath}")
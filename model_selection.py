@@ -0,0 +1,161 @@
+"""
+Model Selection Policies for Spotify Churn Prediction
+Choose the model to deploy from the results summary, trading prediction
+quality against training and serving cost.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+SELECTION_POLICY_PATH = 'selection_policy.json'
+
+# Working-copy pointer naming the deployed model (its pickle/compact export is churn_model_*)
+BEST_MODEL_PATH = 'best_model.json'
+
+# Cost columns of the compact export, which the app serves instead of the pickle where one exists
+SERVED_COST_COLUMNS = {'predict_p99_ms': 'compact_p99_ms', 'model_size_kb': 'compact_size_kb'}
+
+class NoFeasibleModelError(ValueError):
+    """No trained model satisfies the selection policy"""
+
+def model_path(model_name, filepath_prefix='churn_model'):
+    """Pickle file of one trained model, as written by ChurnModelTrainer.save_models"""
+    return f"{filepath_prefix}_{model_name.lower().replace(' ', '_')}.pkl"
+
+def model_quality(summary):
+    """F1 per model: cross-validated when a model search ran, otherwise on the test set"""
+    if 'cv_f1' in summary.columns:
+        return summary['cv_f1'].fillna(summary['f1_score'])
+    return summary['f1_score']
+
+def served_costs(summary):
+    """Summary with the latency and size of the artifact the app serves: the compact export where one exists"""
+    summary = summary.copy()
+    for column, compact_column in SERVED_COST_COLUMNS.items():
+        if column in summary.columns and compact_column in summary.columns:
+            summary[column] = summary[compact_column].fillna(summary[column])
+    return summary
+
+def pareto_front(summary, cost='predict_p99_ms'):
+    """Models not dominated by another model that is at least as good and at least as cheap"""
+    quality = model_quality(summary)
+    front = []
+    for name in summary.index:
+        dominated = (
+            (quality >= quality[name]) & (summary[cost] <= summary.loc[name, cost])
+            & ((quality > quality[name]) | (summary[cost] < summary.loc[name, cost]))
+        )
+        if not dominated.any():
+            front.append(name)
+    return front
+
+class MaxF1Policy:
+    """Deploy the model with the highest F1, regardless of cost"""
+    
+    def select(self, summary):
+        return model_quality(summary).idxmax()
+    
+    def describe(self):
+        return "highest F1"
+    
+    def to_dict(self):
+        return {'policy': 'max_f1'}
+
+class BudgetPolicy:
+    """
+    Deploy the model with the highest F1 among those within every serving
+    budget: p99 single-row latency, peak RSS growth during the fit and model
+    size (None = no limit). Latency and size are those of the served
+    artifact (see served_costs).
+    """
+    
+    def __init__(self, max_p99_ms=None, max_rss_mb=None, max_size_kb=None):
+        self.budgets = {'predict_p99_ms': max_p99_ms, 'peak_rss_mb': max_rss_mb, 'model_size_kb': max_size_kb}
+    
+    def select(self, summary):
+        summary = served_costs(summary)
+        feasible = pd.Series(True, index=summary.index)
+        for column, limit in self.budgets.items():
+            if limit is None:
+                continue
+            if column not in summary.columns:
+                raise ValueError(f"Results summary has no '{column}' column; rerun model_training.py")
+            feasible &= summary[column] <= limit
+        if not feasible.any():
+            raise NoFeasibleModelError(f"No model meets the serving budget ({self.describe()})")
+        return model_quality(summary[feasible]).idxmax()
+    
+    def describe(self):
+        limits = [f"{column} <= {limit}" for column, limit in self.budgets.items() if limit is not None]
+        return "highest F1 with " + (", ".join(limits) if limits else "no budget")
+    
+    def to_dict(self):
+        return {'policy': 'budget', **{f'max_{column}': limit for column, limit in self.budgets.items()}}
+
+class ParetoPolicy:
+    """
+    Deploy the cheapest model on the F1/cost Pareto front whose F1 is within
+    tolerance of the best, so a rounding-error F1 gain cannot buy a much
+    more expensive model. Latency and size are those of the served
+    artifact (see served_costs).
+    """
+    
+    def __init__(self, tolerance=0.01, cost='predict_p99_ms'):
+        self.tolerance = tolerance
+        self.cost = cost
+    
+    def select(self, summary):
+        if self.cost not in summary.columns:
+            raise ValueError(f"Results summary has no '{self.cost}' column; rerun model_training.py")
+        summary = served_costs(summary)
+        quality = model_quality(summary)
+        front = summary.loc[pareto_front(summary, self.cost)]
+        candidates = front[quality[front.index] >= quality.max() - self.tolerance]
+        return candidates[self.cost].idxmin()
+    
+    def describe(self):
+        return f"cheapest {self.cost} within {self.tolerance} F1 of the best"
+    
+    def to_dict(self):
+        return {'policy': 'pareto', 'tolerance': self.tolerance, 'cost': self.cost}
+
+def policy_from_dict(config):
+    """Rebuild a policy from its to_dict() form"""
+    config = dict(config)
+    kind = config.pop('policy')
+    if kind == 'max_f1':
+        return MaxF1Policy()
+    if kind == 'budget':
+        return BudgetPolicy(config.get('max_predict_p99_ms'), config.get('max_peak_rss_mb'),
+                            config.get('max_model_size_kb'))
+    if kind == 'pareto':
+        return ParetoPolicy(**config)
+    raise ValueError(f"Unknown selection policy: {kind}")
+
+def save_policy(policy, filepath=SELECTION_POLICY_PATH):
+    """Persist the deployment policy so the app selects the same model"""
+    with open(filepath, 'w') as f:
+        json.dump(policy.to_dict(), f, indent=2)
+    print(f"Saved: {filepath}")
+
+def save_best_model_pointer(model_name, policy, filepath=BEST_MODEL_PATH):
+    """Record which saved model is deployed (a pointer, not another copy of the model)"""
+    with open(filepath, 'w') as f:
+        json.dump({'model': model_name, 'policy': policy.to_dict()}, f, indent=2)
+    print(f"Saved: {filepath}")
+
+def load_best_model_pointer(filepath=BEST_MODEL_PATH):
+    """Name of the deployed model recorded by the last training run, or None"""
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath) as f:
+        return json.load(f)['model']
+
+def load_policy(filepath=SELECTION_POLICY_PATH):
+    """Load the deployment policy (highest F1 if none was saved)"""
+    if not os.path.exists(filepath):
+        return MaxF1Policy()
+    with open(filepath) as f:
+        return policy_from_dict(json.load(f))
@@ -6,19 +6,200 @@ Trains multiple ML models and evaluates their performance.
 import pandas as pd
 import numpy as np
 import pickle
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import (
-    accuracy_score, precision_score, recall_score, f1_score,
-    roc_auc_score, confusion_matrix, classification_report,
-    roc_curve, precision_recall_curve
-)
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeClassifier
+import scipy.sparse as sp
 import xgboost as xgb
-import matplotlib.pyplot as plt
-import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout
+from threadpoolctl import threadpool_limits
+
+from artifact_store import ArtifactStore
+from compact_ensemble import THRESHOLD_DTYPES, CompactEnsemble, compact_path, compare_predictions, fidelity_ok
+from data_preprocessing import (
+    load_processed_data, iter_data_chunks, read_excel_cached, row_fingerprints, PROCESSED_DATA_DIR,
+    SpotifyDataPreprocessor
+)
+from model_evaluation import EVALUATION_DATA_PATH, MetricsAccumulator, save_evaluation_data
+from model_selection import (
+    MaxF1Policy, BudgetPolicy, ParetoPolicy, NoFeasibleModelError, BEST_MODEL_PATH, SELECTION_POLICY_PATH,
+    model_path, load_policy, save_best_model_pointer, save_policy
+)
+
+# Default hyperparameters of each candidate model
+MODEL_DEFAULTS = {
+    'Logistic Regression': {'random_state': 42, 'max_iter': 1000},
+    'Random Forest': {'n_estimators': 100, 'max_depth': 10, 'random_state': 42},
+    'XGBoost': {'n_estimators': 100, 'max_depth': 6, 'learning_rate': 0.1, 'random_state': 42, 'eval_metric': 'logloss',
+                'tree_method': 'hist', 'max_bin': 256},
+}
+
+# Upper bound on boosting rounds when XGBoost stops early on a validation set
+XGB_MAX_ROUNDS = 1000
+
+MODEL_CLASSES = {
+    'Logistic Regression': LogisticRegression,
+    'Random Forest': RandomForestClassifier,
+    'XGBoost': xgb.XGBClassifier,
+}
+
+def build_model(model_name, params=None, n_jobs=None):
+    """Instantiate a candidate model from its defaults, overridden by params"""
+    kwargs = {**MODEL_DEFAULTS[model_name], **(params or {})}
+    if model_name != 'Logistic Regression':
+        kwargs['n_jobs'] = n_jobs
+    return MODEL_CLASSES[model_name](**kwargs)
+
+# Distilled student models by kind: result name and constructor (see ChurnModelTrainer.distill)
+STUDENT_MODELS = {
+    'tree': ('Distilled Tree', lambda max_depth: DecisionTreeClassifier(max_depth=max_depth, random_state=42)),
+    'logistic': ('Distilled Logistic Regression', lambda max_depth: LogisticRegression(random_state=42, max_iter=1000)),
+}
+
+# Training/serving cost columns recorded per model in model_results_summary.csv
+COST_COLUMNS = ['fit_time_s', 'fit_cpu_s', 'peak_rss_mb', 'predict_p50_ms', 'predict_p99_ms',
+                'throughput_rows_s', 'model_size_kb', 'compact_p99_ms', 'compact_size_kb']
+
+# Tree ensembles that are also exported as flat arrays for serving (see compact_ensemble)
+COMPACT_MODELS = ('Random Forest', 'XGBoost', 'Distilled Tree')
+
+def current_rss_mb():
+    """Current resident set size of this process in MB (None where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the resource module is unavailable)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+@contextmanager
+def measure_fit_cost(cost, sample_interval=0.005):
+    """
+    Record fit wall time, CPU time (all threads) and peak RSS into the cost dict.
+    peak_rss_mb is the growth of RSS during the fit over its value at the
+    start, sampled by a background thread, so it does not depend on what
+    was trained earlier in the same process. Without /proc it falls back to
+    the growth of the process high-water mark (0 once an earlier fit peaked
+    higher).
+    """
+    start_rss = current_rss_mb()
+    start_peak = peak_rss_mb()
+    samples = [start_rss or 0.0]
+    done = threading.Event()
+    
+    def sample():
+        while not done.wait(sample_interval):
+            samples.append(current_rss_mb())
+    
+    sampler = threading.Thread(target=sample, daemon=True) if start_rss is not None else None
+    if sampler is not None:
+        sampler.start()
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield cost
+    finally:
+        cost['fit_time_s'] = time.perf_counter() - start_wall
+        cost['fit_cpu_s'] = time.process_time() - start_cpu
+        done.set()
+        if sampler is not None:
+            sampler.join()
+            samples.append(current_rss_mb())
+            cost['peak_rss_mb'] = max(samples) - start_rss
+        elif start_peak is not None:
+            cost['peak_rss_mb'] = peak_rss_mb() - start_peak
+        else:
+            cost['peak_rss_mb'] = None
+
+def measure_inference_cost(model, X, n_single=200, batch_rows=20000):
+    """
+    Serving cost of a fitted model: single-row predict_proba latency
+    percentiles over n_single calls, batch throughput on batch_rows rows
+    (X tiled as needed) and pickled model size. Sparse X stays sparse.
+    """
+    if not sp.issparse(X):
+        X = np.asarray(X)
+    n_rows = X.shape[0]
+    model.predict_proba(X[:1])  # warm-up
+    
+    latencies = np.empty(n_single)
+    for i in range(n_single):
+        row = X[i % n_rows:i % n_rows + 1]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        latencies[i] = time.perf_counter() - start
+    
+    n_copies = -(-batch_rows // n_rows)
+    if sp.issparse(X):
+        X_batch = sp.vstack([X] * n_copies, format='csr')[:batch_rows]
+    else:
+        X_batch = np.tile(X, (n_copies, 1))[:batch_rows]
+    start = time.perf_counter()
+    model.predict_proba(X_batch)
+    batch_time = time.perf_counter() - start
+    
+    return {
+        'predict_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'predict_p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'throughput_rows_s': batch_rows / batch_time,
+        'model_size_kb': len(pickle.dumps(model)) / 1024,
+    }
+
+class ChunkedDataIter(xgb.DataIter):
+    """
+    xgboost data iterator over (X, y) chunks, e.g. the streamed preprocessing
+    output. xgboost passes over the data several times while it sketches
+    feature quantiles and writes its on-disk cache pages, so chunk_source is
+    a zero-argument callable returning a fresh chunk iterator per pass.
+    """
+    
+    def __init__(self, chunk_source, cache_prefix):
+        self.chunk_source = chunk_source
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+    
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = iter(self.chunk_source())
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        X_chunk, y_chunk = chunk
+        input_data(data=X_chunk, label=y_chunk)
+        return True
+    
+    def reset(self):
+        self._chunks = None
+
+def external_dmatrix(data_iter, ref=None, max_bin=256, nthread=None):
+    """
+    External-memory DMatrix over a ChunkedDataIter: an ExtMemQuantileDMatrix
+    on xgboost >= 3.0, a DMatrix with on-disk cache pages on 2.x (which
+    quantizes with the booster's max_bin at training time instead).
+    """
+    if hasattr(xgb, 'ExtMemQuantileDMatrix'):
+        return xgb.ExtMemQuantileDMatrix(data_iter, ref=ref, max_bin=max_bin, nthread=nthread)
+    return xgb.DMatrix(data_iter, nthread=nthread)
 
 class ChurnModelTrainer:
     """Class to train and evaluate churn prediction models"""
@@ -26,15 +207,18 @@ class ChurnModelTrainer:
     def __init__(self):
         self.models = {}
         self.results = {}
+        self.release = None  # artifact store release the models were loaded from
         
-    def train_logistic_regression(self, X_train, y_train, X_test, y_test):
+    def train_logistic_regression(self, X_train, y_train, X_test, y_test, params=None, measure_serving=True):
         """Train Logistic Regression model"""
         print("\n" + "="*50)
         print("Training Logistic Regression...")
         print("="*50)
         
-        model = LogisticRegression(random_state=42, max_iter=1000)
-        model.fit(X_train, y_train)
+        model = build_model('Logistic Regression', params)
+        cost = {}
+        with measure_fit_cost(cost):
+            model.fit(X_train, y_train)
         
         # Predictions
         y_pred = model.predict(X_test)
@@ -42,31 +226,32 @@ class ChurnModelTrainer:
         
         # Metrics
         metrics = self.calculate_metrics(y_test, y_pred, y_pred_proba)
+        if measure_serving:
+            cost.update(measure_inference_cost(model, X_test))
         
         self.models['Logistic Regression'] = model
         self.results['Logistic Regression'] = {
             'model': model,
             'metrics': metrics,
             'y_pred': y_pred,
-            'y_pred_proba': y_pred_proba
+            'y_pred_proba': y_pred_proba,
+            'cost': cost
         }
         
         self.print_metrics('Logistic Regression', metrics)
+        self.print_cost(cost)
         return model, metrics
     
-    def train_random_forest(self, X_train, y_train, X_test, y_test):
+    def train_random_forest(self, X_train, y_train, X_test, y_test, n_jobs=-1, params=None, measure_serving=True):
         """Train Random Forest model"""
         print("\n" + "="*50)
         print("Training Random Forest...")
         print("="*50)
         
-        model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42,
-            n_jobs=-1
-        )
-        model.fit(X_train, y_train)
+        model = build_model('Random Forest', params, n_jobs=n_jobs)
+        cost = {}
+        with measure_fit_cost(cost):
+            model.fit(X_train, y_train)
         
         # Predictions
         y_pred = model.predict(X_test)
@@ -74,6 +259,8 @@ class ChurnModelTrainer:
         
         # Metrics
         metrics = self.calculate_metrics(y_test, y_pred, y_pred_proba)
+        if measure_serving:
+            cost.update(measure_inference_cost(model, X_test))
         
         self.models['Random Forest'] = model
         self.results['Random Forest'] = {
@@ -81,26 +268,42 @@ class ChurnModelTrainer:
             'metrics': metrics,
             'y_pred': y_pred,
             'y_pred_proba': y_pred_proba,
-            'feature_importance': model.feature_importances_
+            'feature_importance': model.feature_importances_,
+            'cost': cost
         }
         
         self.print_metrics('Random Forest', metrics)
+        self.print_cost(cost)
         return model, metrics
     
-    def train_xgboost(self, X_train, y_train, X_test, y_test):
-        """Train XGBoost model"""
+    def train_xgboost(self, X_train, y_train, X_test, y_test, n_jobs=None, params=None, validation_fraction=0.1,
+                      measure_serving=True):
+        """
+        Train XGBoost model.
+        If params set early_stopping_rounds, a stratified validation_fraction of
+        the training rows is held out as eval_set, boosting stops once its
+        logloss stops improving, and the booster is trimmed to best_iteration.
+        measure_serving=False skips the inference cost (see train_all).
+        """
         print("\n" + "="*50)
         print("Training XGBoost...")
         print("="*50)
         
-        model = xgb.XGBClassifier(
-            n_estimators=100,
-            max_depth=6,
-            learning_rate=0.1,
-            random_state=42,
-            eval_metric='logloss'
-        )
-        model.fit(X_train, y_train)
+        model = build_model('XGBoost', params, n_jobs=n_jobs)
+        best_iteration = None
+        cost = {}
+        with measure_fit_cost(cost):
+            if model.early_stopping_rounds:
+                X_fit, X_val, y_fit, y_val = train_test_split(
+                    X_train, y_train, test_size=validation_fraction, random_state=42, stratify=y_train
+                )
+                model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+                best_iteration = model.best_iteration
+                print(f"Early stopping: best iteration {best_iteration} of {model.get_booster().num_boosted_rounds()} "
+                      f"(validation logloss {model.best_score:.4f})")
+                model = self._trim_xgboost(model, best_iteration)
+            else:
+                model.fit(X_train, y_train)
         
         # Predictions
         y_pred = model.predict(X_test)
@@ -108,6 +311,8 @@ class ChurnModelTrainer:
         
         # Metrics
         metrics = self.calculate_metrics(y_test, y_pred, y_pred_proba)
+        if measure_serving:
+            cost.update(measure_inference_cost(model, X_test))
         
         self.models['XGBoost'] = model
         self.results['XGBoost'] = {
@@ -115,23 +320,354 @@ class ChurnModelTrainer:
             'metrics': metrics,
             'y_pred': y_pred,
             'y_pred_proba': y_pred_proba,
-            'feature_importance': model.feature_importances_
+            'feature_importance': model.feature_importances_,
+            'best_iteration': best_iteration,
+            'cost': cost
         }
         
         self.print_metrics('XGBoost', metrics)
+        self.print_cost(cost)
         return model, metrics
     
-    def calculate_metrics(self, y_true, y_pred, y_pred_proba):
-        """Calculate evaluation metrics"""
-        metrics = {
-            'accuracy': accuracy_score(y_true, y_pred),
-            'precision': precision_score(y_true, y_pred, zero_division=0),
-            'recall': recall_score(y_true, y_pred, zero_division=0),
-            'f1_score': f1_score(y_true, y_pred, zero_division=0),
-            'roc_auc': roc_auc_score(y_true, y_pred_proba) if len(np.unique(y_true)) > 1 else 0.0,
-            'confusion_matrix': confusion_matrix(y_true, y_pred)
+    def train_xgboost_external(self, chunk_source, test_chunk_source, n_jobs=None, params=None,
+                               validation_chunk_source=None, cache_dir=None):
+        """
+        Train XGBoost out of core: training chunks are streamed through a
+        ChunkedDataIter into an external-memory QuantileDMatrix whose pages
+        live in a temporary directory under cache_dir, so only one chunk is
+        in memory at a time. The *_chunk_source arguments are zero-argument
+        callables returning fresh iterators of (X, y) chunks. If params set
+        early_stopping_rounds, the validation chunks are the eval set. The
+        test chunks are scored in one streaming pass.
+        """
+        print("\n" + "="*50)
+        print("Training XGBoost (external memory)...")
+        print("="*50)
+        
+        kwargs = {**MODEL_DEFAULTS['XGBoost'], **(params or {}), 'n_jobs': n_jobs}
+        early_stopping_rounds = kwargs.pop('early_stopping_rounds', None)
+        train_params = {
+            key: value for key, value in xgb.XGBClassifier(**kwargs).get_xgb_params().items() if value is not None
+        }
+        best_iteration = None
+        cost = {}
+        tmp_dir = tempfile.mkdtemp(prefix='churn_xgb_', dir=cache_dir)
+        try:
+            with measure_fit_cost(cost):
+                dtrain = external_dmatrix(ChunkedDataIter(chunk_source, os.path.join(tmp_dir, 'train')),
+                                          max_bin=kwargs['max_bin'], nthread=n_jobs)
+                print(f"External-memory training matrix: {dtrain.num_row():,} rows x {dtrain.num_col()} features")
+                evals = []
+                if early_stopping_rounds:
+                    dval = external_dmatrix(
+                        ChunkedDataIter(validation_chunk_source, os.path.join(tmp_dir, 'validation')),
+                        ref=dtrain, max_bin=kwargs['max_bin'], nthread=n_jobs
+                    )
+                    evals = [(dval, 'validation')]
+                booster = xgb.train(train_params, dtrain, num_boost_round=kwargs['n_estimators'], evals=evals,
+                                    early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+                if early_stopping_rounds:
+                    best_iteration = booster.best_iteration
+                    print(f"Early stopping: best iteration {best_iteration} of {booster.num_boosted_rounds()} "
+                          f"(validation logloss {booster.best_score:.4f})")
+                    booster = booster[:best_iteration + 1]
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        
+        # Same estimator interface as the in-memory model
+        model = xgb.XGBClassifier(**{**kwargs, 'n_estimators': booster.num_boosted_rounds()})
+        model.load_model(bytearray(booster.save_raw('ubj')))
+        
+        # Metrics over the streamed test chunks
+        accumulator = MetricsAccumulator()
+        X_sample = None
+        for X_chunk, y_chunk in test_chunk_source():
+            accumulator.update(y_chunk, model.predict_proba(X_chunk)[:, 1])
+            if X_sample is None:
+                X_sample = X_chunk[:1000]
+        metrics = accumulator.metrics()
+        cost.update(measure_inference_cost(model, X_sample))
+        
+        self.models['XGBoost'] = model
+        self.results['XGBoost'] = {
+            'model': model,
+            'metrics': metrics,
+            'feature_importance': model.feature_importances_,
+            'best_iteration': best_iteration,
+            'cost': cost
         }
-        return metrics
+        
+        self.print_metrics('XGBoost', metrics)
+        self.print_cost(cost)
+        return model, metrics
+    
+    @staticmethod
+    def _trim_xgboost(model, best_iteration):
+        """Return a copy of an early-stopped XGBoost model holding only its first best_iteration + 1 trees"""
+        n_trees = best_iteration + 1
+        params = {**model.get_params(), 'n_estimators': n_trees, 'early_stopping_rounds': None}
+        trimmed = xgb.XGBClassifier(**params)
+        trimmed.load_model(bytearray(model.get_booster()[:n_trees].save_raw('ubj')))
+        return trimmed
+    
+    def train_all(self, X_train, y_train, X_test, y_test, parallel=True, thread_budget=None, data_dir=None,
+                  model_params=None):
+        """
+        Train every candidate model.
+        With parallel=True each model is fitted in its own worker process with
+        an explicit thread budget, so Random Forest and XGBoost threads do not
+        oversubscribe the machine; results are stored as each model finishes.
+        Serving cost is then measured here, one model at a time, since
+        latencies timed next to still-fitting siblings mostly measure contention.
+        If data_dir is given, workers memory-map the processed data from disk
+        instead of receiving pickled copies of the arrays. model_params maps
+        model names to hyperparameter overrides (e.g. from a model search).
+        """
+        model_params = model_params or {}
+        if not parallel:
+            for model_name, method in MODEL_TRAINERS.items():
+                getattr(self, method)(X_train, y_train, X_test, y_test, params=model_params.get(model_name))
+            return self.results
+        
+        thread_budget = thread_budget or default_thread_budget()
+        print(f"\nTraining {len(MODEL_TRAINERS)} models in parallel (threads per model: {thread_budget})")
+        data = None if data_dir is not None else (X_train, y_train, X_test, y_test)
+        
+        with ProcessPoolExecutor(max_workers=len(MODEL_TRAINERS)) as executor:
+            futures = {
+                executor.submit(
+                    _train_model_worker, model_name, thread_budget[model_name], data, data_dir,
+                    model_params.get(model_name)
+                ): model_name
+                for model_name in MODEL_TRAINERS
+            }
+            for future in as_completed(futures):
+                model_name = futures[future]
+                result, log, elapsed = future.result()
+                self.models[model_name] = result['model']
+                self.results[model_name] = result
+                print(log, end='')
+                print(f"[{model_name} finished in {elapsed:.1f}s]")
+        
+        # Keep a deterministic model order for reporting and tie-breaking
+        self.results = {name: self.results[name] for name in MODEL_TRAINERS}
+        self.models = {name: self.models[name] for name in MODEL_TRAINERS}
+        
+        print("\nServing cost (measured one model at a time):")
+        for model_name, result in self.results.items():
+            cost = result['cost']
+            cost.update(measure_inference_cost(result['model'], X_test))
+            print(f"  {model_name}: p50 {cost['predict_p50_ms']:.3f} ms, p99 {cost['predict_p99_ms']:.3f} ms, "
+                  f"{cost['throughput_rows_s']:,.0f} rows/s, {cost['model_size_kb']:.1f} KB")
+        return self.results
+    
+    def load_models(self, filepath_prefix='churn_model', store=None, ref='best'):
+        """Load the models of the release a store ref points to, else the files written by save_models"""
+        deployment = store.resolve(ref) if store is not None else None
+        if deployment is not None:
+            self.release, manifest, _ = deployment
+            for name, digest in manifest['artifacts'].items():
+                if name.startswith('model:'):
+                    self.models[name.split(':', 1)[1]] = store.load_object(digest)
+            print(f"Loaded {len(self.models)} models from release {self.release[:12]}")
+            return self.models
+        
+        for model_name in MODEL_TRAINERS:
+            filename = model_path(model_name, filepath_prefix)
+            with open(filename, 'rb') as f:
+                self.models[model_name] = pickle.load(f)
+            print(f"Loaded: {filename}")
+        return self.models
+    
+    def update_logistic_regression(self, X_new, y_new, epochs=5):
+        """
+        Continue training the logistic model on new rows with SGD.
+        A LogisticRegression is first converted to an SGDClassifier with
+        log loss, warm-started from its coefficients; afterwards each update
+        runs `epochs` partial_fit passes over the new rows.
+        """
+        model = self.models['Logistic Regression']
+        if isinstance(model, LogisticRegression):
+            sgd = SGDClassifier(loss='log_loss', learning_rate='constant', eta0=0.01, max_iter=epochs, tol=None,
+                                random_state=42)
+            sgd.fit(X_new, y_new, coef_init=model.coef_, intercept_init=model.intercept_)
+            model = sgd
+        else:
+            for _ in range(epochs):
+                model.partial_fit(X_new, y_new)
+        return model
+    
+    def update_random_forest(self, X_new, y_new, n_new_trees=20):
+        """Grow the forest with n_new_trees trees fitted on the new rows (warm_start)"""
+        model = self.models['Random Forest']
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + n_new_trees)
+        model.fit(X_new, y_new)
+        return model
+    
+    def update_xgboost(self, X_new, y_new, n_new_trees=20):
+        """Continue boosting from the current booster with n_new_trees rounds on the new rows"""
+        model = self.models['XGBoost']
+        booster = model.get_booster()
+        model.set_params(n_estimators=n_new_trees, early_stopping_rounds=None)
+        model.fit(X_new, y_new, xgb_model=booster)
+        model.set_params(n_estimators=model.get_booster().num_boosted_rounds())
+        return model
+    
+    def update(self, X_new, y_new, X_test=None, y_test=None, n_new_trees=20):
+        """
+        Refresh every loaded model that has an updater (MODEL_UPDATERS) with
+        a new batch of rows instead of retraining from scratch; other models,
+        e.g. distilled students, are kept as they are. Every model is then
+        re-evaluated on the test set if given.
+        """
+        for model_name, model in list(self.models.items()):
+            cost = {}
+            method = MODEL_UPDATERS.get(model_name)
+            if method is None:
+                print(f"\nKept {model_name} (no incremental update)")
+            else:
+                with measure_fit_cost(cost):
+                    if model_name == 'Logistic Regression':
+                        model = getattr(self, method)(X_new, y_new)
+                    else:
+                        model = getattr(self, method)(X_new, y_new, n_new_trees=n_new_trees)
+                self.models[model_name] = model
+                print(f"\nUpdated {model_name} on {len(y_new)} rows in {cost['fit_time_s']:.2f}s")
+            
+            if X_test is not None:
+                y_pred = model.predict(X_test)
+                y_pred_proba = model.predict_proba(X_test)[:, 1]
+                metrics = self.calculate_metrics(y_test, y_pred, y_pred_proba)
+                cost.update(measure_inference_cost(model, X_test))
+                self.results[model_name] = {
+                    'model': model,
+                    'metrics': metrics,
+                    'y_pred': y_pred,
+                    'y_pred_proba': y_pred_proba,
+                    'cost': cost
+                }
+                if hasattr(model, 'feature_importances_'):
+                    self.results[model_name]['feature_importance'] = model.feature_importances_
+                self.print_metrics(model_name, metrics)
+        return self.models
+    
+    def distill(self, X_train, X_test, y_test, student='tree', teacher=None, max_depth=4, X_augment=None):
+        """
+        Fit a compact student model to a teacher's predicted probabilities
+        (default teacher: the highest-F1 model). Every training row, plus
+        the optional unlabeled X_augment rows, is shown to the student twice,
+        as class 0 with weight 1 - p and as class 1 with weight p, so it
+        minimizes cross-entropy against the teacher's soft labels. Fidelity
+        to the teacher and the latency gain are reported, and the student
+        joins the results as a deployable candidate model.
+        """
+        teacher = teacher or self.get_best_model()[0]
+        teacher_model = self.models[teacher]
+        model_name, build_student = STUDENT_MODELS[student]
+        print("\n" + "="*50)
+        print(f"Distilling {teacher} into {model_name}...")
+        print("="*50)
+        
+        X_transfer = X_train
+        if X_augment is not None:
+            X_transfer = sp.vstack([X_train, X_augment]) if sp.issparse(X_train) else np.vstack([X_train, X_augment])
+        stack = sp.vstack if sp.issparse(X_transfer) else np.vstack
+        
+        model = build_student(max_depth)
+        cost = {}
+        with measure_fit_cost(cost):
+            soft_labels = teacher_model.predict_proba(X_transfer)[:, 1]
+            n_rows = len(soft_labels)
+            model.fit(stack([X_transfer, X_transfer]), np.r_[np.zeros(n_rows), np.ones(n_rows)],
+                      sample_weight=np.r_[1 - soft_labels, soft_labels])
+        print(f"Transfer set: {n_rows} rows ({n_rows - X_train.shape[0]} synthetic)")
+        
+        # Predictions
+        y_pred = model.predict(X_test)
+        y_pred_proba = model.predict_proba(X_test)[:, 1]
+        
+        # Metrics, fidelity to the teacher and serving cost
+        metrics = self.calculate_metrics(y_test, y_pred, y_pred_proba)
+        fidelity = compare_predictions(teacher_model, model, X_test)
+        cost.update(measure_inference_cost(model, X_test))
+        
+        self.models[model_name] = model
+        self.results[model_name] = {
+            'model': model,
+            'metrics': metrics,
+            'y_pred': y_pred,
+            'y_pred_proba': y_pred_proba,
+            'teacher': teacher,
+            'teacher_agreement': fidelity['agreement'],
+            'teacher_mae': fidelity['mean_abs_diff'],
+            'cost': cost
+        }
+        if hasattr(model, 'feature_importances_'):
+            self.results[model_name]['feature_importance'] = model.feature_importances_
+        
+        self.print_metrics(model_name, metrics)
+        self.print_cost(cost)
+        teacher_p99 = self.results[teacher]['cost']['predict_p99_ms']
+        print(f"\nFidelity to {teacher}: prediction agreement {fidelity['agreement']:.2%}, "
+              f"mean |dP| {fidelity['mean_abs_diff']:.4f}, max |dP| {fidelity['max_abs_diff']:.4f}")
+        print(f"F1: {metrics['f1_score']:.4f} vs {self.results[teacher]['metrics']['f1_score']:.4f} for {teacher}")
+        print(f"Latency: p99 {cost['predict_p99_ms']:.3f} ms vs {teacher_p99:.3f} ms for {teacher} "
+              f"({teacher_p99 / cost['predict_p99_ms']:.1f}x faster), size {cost['model_size_kb']:.1f} KB "
+              f"vs {self.results[teacher]['cost']['model_size_kb']:.1f} KB")
+        return model, metrics
+    
+    def export_compact(self, X_test, threshold_dtype='float32'):
+        """
+        Flatten the tree ensembles into CompactEnsemble arrays, check them
+        against the original models on X_test and record their serving cost.
+        Exports that fail the fidelity check are dropped, so the pickled
+        model is saved and served instead.
+        """
+        for model_name in COMPACT_MODELS:
+            if model_name not in self.results:
+                continue
+            result = self.results[model_name]
+            result.pop('compact', None)
+            compact = CompactEnsemble.from_model(result['model'], threshold_dtype, sparse_input=sp.issparse(X_test))
+            fidelity = compare_predictions(result['model'], compact, X_test)
+            print(f"\nCompact {model_name}: {compact.describe()}")
+            if not fidelity_ok(fidelity, threshold_dtype):
+                print(f"  Dropped: max |dP| {fidelity['max_abs_diff']:.2e}, "
+                      f"prediction agreement {fidelity['agreement']:.2%}; the pickled model will be served")
+                for column in ('compact_p99_ms', 'compact_size_kb'):
+                    result.get('cost', {}).pop(column, None)
+                continue
+            compact_cost = measure_inference_cost(compact, X_test)
+            result['compact'] = compact
+            result.setdefault('cost', {}).update({
+                'compact_p99_ms': compact_cost['predict_p99_ms'],
+                'compact_size_kb': len(compact.to_bytes()) / 1024,
+            })
+            print(f"  p99 {compact_cost['predict_p99_ms']:.3f} ms, max |dP| {fidelity['max_abs_diff']:.2e}, "
+                  f"prediction agreement {fidelity['agreement']:.2%}")
+        return {name: result['compact'] for name, result in self.results.items() if 'compact' in result}
+    
+    def calculate_metrics(self, y_true, y_pred, y_pred_proba):
+        """Calculate evaluation metrics and ROC/PR curves in one pass (see MetricsAccumulator)"""
+        return MetricsAccumulator().update(y_true, y_pred_proba, y_pred).metrics()
+    
+    def evaluate_chunks(self, chunks):
+        """
+        Evaluate every loaded model over a stream of (X, y) chunks in a single
+        pass: each chunk is scored by all models and then released, so test
+        sets larger than memory can be evaluated. Returns {model_name: metrics}.
+        """
+        accumulators = {model_name: MetricsAccumulator() for model_name in self.models}
+        n_rows = 0
+        for X_chunk, y_chunk in chunks:
+            for model_name, model in self.models.items():
+                accumulators[model_name].update(y_chunk, model.predict_proba(X_chunk)[:, 1])
+            n_rows += len(y_chunk)
+            print(f"  Evaluated {n_rows:,} rows")
+        
+        for model_name, accumulator in accumulators.items():
+            self.results[model_name] = {'model': self.models[model_name], 'metrics': accumulator.metrics()}
+        return {model_name: result['metrics'] for model_name, result in self.results.items()}
     
     def print_metrics(self, model_name, metrics):
         """Print model metrics"""
@@ -144,177 +680,486 @@ class ChurnModelTrainer:
         print(f"\nConfusion Matrix:")
         print(metrics['confusion_matrix'])
     
-    def get_best_model(self):
-        """Get the best model based on F1-score"""
-        best_model_name = None
-        best_f1 = 0
-        
-        for model_name, result in self.results.items():
-            f1 = result['metrics']['f1_score']
-            if f1 > best_f1:
-                best_f1 = f1
-                best_model_name = model_name
-        
+    def print_cost(self, cost):
+        """Print model training and serving cost"""
+        print(f"\nCost:")
+        print(f"  Fit:        {cost['fit_time_s']:.2f}s wall, {cost['fit_cpu_s']:.2f}s CPU")
+        if cost.get('peak_rss_mb') is not None:
+            print(f"  Peak RSS:   +{cost['peak_rss_mb']:.1f} MB during fit")
+        if 'predict_p99_ms' not in cost:
+            return
+        print(f"  Latency:    p50 {cost['predict_p50_ms']:.3f} ms, p99 {cost['predict_p99_ms']:.3f} ms (single row)")
+        print(f"  Throughput: {cost['throughput_rows_s']:,.0f} rows/s")
+        print(f"  Size:       {cost['model_size_kb']:.1f} KB")
+    
+    def summary(self):
+        """One row per model: quality metrics, cost, and CV F1 / best iteration when recorded"""
+        summary = pd.DataFrame({
+            model_name: result['metrics']
+            for model_name, result in self.results.items()
+        }).T
+        summary = summary[['accuracy', 'precision', 'recall', 'f1_score', 'roc_auc']].astype(float)
+        cost_summary = pd.DataFrame({name: result.get('cost', {}) for name, result in self.results.items()}).T
+        summary = summary.join(cost_summary.reindex(columns=COST_COLUMNS).astype(float))
+        for column in ['cv_f1', 'cv_f1_std', 'teacher_agreement', 'teacher_mae']:
+            if any(column in result for result in self.results.values()):
+                summary[column] = [self.results[name].get(column) for name in summary.index]
+        if any(result.get('best_iteration') is not None for result in self.results.values()):
+            summary['best_iteration'] = pd.array(
+                [self.results[name].get('best_iteration') for name in summary.index], dtype='Int64'
+            )
+        return summary
+    
+    def get_best_model(self, policy=None):
+        """
+        Get the model to deploy under a selection policy (see model_selection).
+        The default policy picks the highest F1 (cross-validated F1 when a
+        model search ran).
+        """
+        best_model_name = (policy or MaxF1Policy()).select(self.summary())
         return best_model_name, self.results[best_model_name]
     
-    def save_models(self, filepath_prefix='churn_model'):
-        """Save all trained models"""
+    def save_models(self, filepath_prefix='churn_model', store=None):
+        """Save all trained models (to the artifact store if given; returns {model_name: digest} then)"""
+        if store is not None:
+            digests = {model_name: store.put_object(result['model']) for model_name, result in self.results.items()}
+            for model_name, digest in digests.items():
+                print(f"Stored: {model_name} ({digest[:12]})")
+            return digests
+        
         for model_name, result in self.results.items():
-            filename = f"{filepath_prefix}_{model_name.lower().replace(' ', '_')}.pkl"
+            filename = model_path(model_name, filepath_prefix)
             with open(filename, 'wb') as f:
                 pickle.dump(result['model'], f)
             print(f"Saved: {filename}")
+            if result.get('compact') is not None:
+                result['compact'].save(compact_path(model_name, filepath_prefix))
+            elif os.path.exists(compact_path(model_name, filepath_prefix)):
+                # A stale export would be served instead of this pickle
+                os.remove(compact_path(model_name, filepath_prefix))
     
-    def save_best_model(self, filepath='best_churn_model.pkl'):
-        """Save the best model"""
-        best_name, best_result = self.get_best_model()
-        with open(filepath, 'wb') as f:
-            pickle.dump(best_result['model'], f)
-        print(f"\n[SUCCESS] Best model ({best_name}) saved to {filepath}")
+    def save_best_model(self, filepath=BEST_MODEL_PATH, policy=None):
+        """Point the working copies at the model selected by the policy (its pickle is written by save_models)"""
+        best_name, _ = self.get_best_model(policy)
+        save_best_model_pointer(best_name, policy or MaxF1Policy(), filepath)
+        print(f"\n[SUCCESS] Best model ({best_name}, {(policy or MaxF1Policy()).describe()}) recorded in {filepath}")
         return best_name
+    
+    def publish_release(self, store, policy=None, files=None, parent=None):
+        """
+        Store every model (and its compact export) and the given report files
+        once by content hash, record them as a release and point the store's
+        "best" ref at the policy's model. Raises NoFeasibleModelError before
+        storing anything if no model satisfies the policy.
+        """
+        policy = policy or MaxF1Policy()
+        best_name = self.get_best_model(policy)[0]
+        artifacts = {f'model:{name}': digest for name, digest in self.save_models(store=store).items()}
+        for model_name, result in self.results.items():
+            if result.get('compact') is not None:
+                artifacts[f'compact:{model_name}'] = store.put(result['compact'].to_bytes())
+        for name, filepath in (files or {}).items():
+            if os.path.exists(filepath):
+                artifacts[name] = store.put_file(filepath)
+        
+        release = store.create_release(artifacts, best_model=best_name, parent=parent,
+                                       metadata={'policy': policy.to_dict()})
+        store.set_ref('latest', {'release': release})
+        store.promote(release, best_name)
+        print(f"\n[SUCCESS] Release {release[:12]} published; best -> {best_name} ({policy.describe()})")
+        return release
 
-def create_visualizations(trainer, X_test, y_test, feature_names):
-    """Create visualization plots for model evaluation"""
-    print("\nCreating visualizations...")
-    
-    # Set style
-    sns.set_style("whitegrid")
-    plt.rcParams['figure.figsize'] = (15, 10)
-    
-    # 1. Model Comparison
-    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-    
-    model_names = list(trainer.results.keys())
-    metrics_to_plot = ['accuracy', 'precision', 'recall', 'f1_score', 'roc_auc']
-    
-    for idx, metric in enumerate(metrics_to_plot):
-        ax = axes[idx // 3, idx % 3]
-        values = [trainer.results[name]['metrics'][metric] for name in model_names]
-        bars = ax.bar(model_names, values, color=['#FF6B6B', '#4ECDC4', '#45B7D1'])
-        ax.set_title(f'{metric.replace("_", " ").title()}', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Score', fontsize=10)
-        ax.set_ylim(0, 1)
-        ax.grid(axis='y', alpha=0.3)
-        
-        # Add value labels on bars
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{height:.3f}', ha='center', va='bottom', fontsize=9)
-        
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-    
-    # Confusion Matrix for best model
-    best_name, best_result = trainer.get_best_model()
-    ax = axes[1, 2]
-    cm = best_result['metrics']['confusion_matrix']
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', ax=ax,
-                xticklabels=['No Churn', 'Churn'],
-                yticklabels=['No Churn', 'Churn'])
-    ax.set_title(f'Confusion Matrix - {best_name}', fontsize=12, fontweight='bold')
-    ax.set_ylabel('Actual', fontsize=10)
-    ax.set_xlabel('Predicted', fontsize=10)
-    
-    plt.tight_layout()
-    plt.savefig('model_comparison.png', dpi=300, bbox_inches='tight')
-    print("Saved: model_comparison.png")
-    plt.close()
-    
-    # 2. ROC Curves
-    plt.figure(figsize=(10, 8))
-    for model_name, result in trainer.results.items():
-        fpr, tpr, _ = roc_curve(y_test, result['y_pred_proba'])
-        auc = result['metrics']['roc_auc']
-        plt.plot(fpr, tpr, label=f'{model_name} (AUC = {auc:.3f})', linewidth=2)
-    
-    plt.plot([0, 1], [0, 1], 'k--', label='Random Classifier')
-    plt.xlabel('False Positive Rate', fontsize=12)
-    plt.ylabel('True Positive Rate', fontsize=12)
-    plt.title('ROC Curves Comparison', fontsize=14, fontweight='bold')
-    plt.legend(loc='lower right', fontsize=10)
-    plt.grid(alpha=0.3)
-    plt.savefig('roc_curves.png', dpi=300, bbox_inches='tight')
-    print("Saved: roc_curves.png")
-    plt.close()
-    
-    # 3. Feature Importance (for tree-based models)
-    tree_models = ['Random Forest', 'XGBoost']
-    if any(name in trainer.results for name in tree_models):
-        fig, axes = plt.subplots(1, 2, figsize=(16, 6))
-        
-        for idx, model_name in enumerate(tree_models):
-            if model_name in trainer.results:
-                ax = axes[idx]
-                importance = trainer.results[model_name]['feature_importance']
-                feature_imp_df = pd.DataFrame({
-                    'feature': feature_names,
-                    'importance': importance
-                }).sort_values('importance', ascending=False).head(15)
-                
-                sns.barplot(data=feature_imp_df, y='feature', x='importance', ax=ax, palette='viridis')
-                ax.set_title(f'{model_name} - Top 15 Features', fontsize=12, fontweight='bold')
-                ax.set_xlabel('Importance', fontsize=10)
-                ax.set_ylabel('Feature', fontsize=10)
-                ax.grid(axis='x', alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig('feature_importance.png', dpi=300, bbox_inches='tight')
-        print("Saved: feature_importance.png")
-        plt.close()
-
-def main():
+# Candidate models and the ChurnModelTrainer method that fits each one
+MODEL_TRAINERS = {
+    'Logistic Regression': 'train_logistic_regression',
+    'Random Forest': 'train_random_forest',
+    'XGBoost': 'train_xgboost',
+}
+
+# ChurnModelTrainer methods that refresh a fitted model with new rows
+MODEL_UPDATERS = {
+    'Logistic Regression': 'update_logistic_regression',
+    'Random Forest': 'update_random_forest',
+    'XGBoost': 'update_xgboost',
+}
+
+def default_thread_budget(n_cores=None):
+    """Split the cores between models: logistic regression is single-threaded, the tree ensembles share the rest"""
+    n_cores = n_cores or os.cpu_count() or 1
+    rest = max(2, n_cores - 1)
+    return {
+        'Logistic Regression': 1,
+        'Random Forest': max(1, rest // 2),
+        'XGBoost': max(1, rest - rest // 2),
+    }
+
+def _train_model_worker(model_name, n_threads, data, data_dir, params=None):
+    """Worker: fit one model under a thread limit, return its results (fit cost only), captured log and wall time"""
+    start_time = time.time()
+    if data_dir is not None:
+        X_train, X_test, y_train, y_test, _ = load_processed_data(data_dir)
+    else:
+        X_train, y_train, X_test, y_test = data
+    
+    trainer = ChurnModelTrainer()
+    train = getattr(trainer, MODEL_TRAINERS[model_name])
+    log = io.StringIO()
+    with threadpool_limits(limits=n_threads), redirect_stdout(log):
+        if model_name == 'Logistic Regression':
+            train(X_train, y_train, X_test, y_test, params=params, measure_serving=False)
+        else:
+            train(X_train, y_train, X_test, y_test, n_jobs=n_threads, params=params, measure_serving=False)
+    return trainer.results[model_name], log.getvalue(), time.time() - start_time
+
+def synthetic_features(n_rows, preprocessor_path='preprocessor.pkl', seed=42, selected_features=None):
+    """Encoded features (selected_features only, if given) of n_rows synthetic survey rows, an unlabeled transfer set for distillation"""
+    from generate_synthetic_data import SyntheticSurveyGenerator
+    
+    preprocessor = SpotifyDataPreprocessor()
+    preprocessor.load_preprocessor(preprocessor_path)
+    if preprocessor.multi_hot:
+        raise ValueError("Synthetic augmentation needs a label-encoded (not multi-hot) preprocessor")
+    preprocessor.selected_features = selected_features
+    generator = SyntheticSurveyGenerator(seed=seed)
+    columns = generator.load_schema()
+    generator.fit(read_excel_cached('Spotify_data.xlsx', columns=columns))
+    X_synthetic, _ = preprocessor.transform(generator.sample(n_rows, np.random.default_rng(seed)))
+    return X_synthetic.to_numpy(dtype=np.float32)
+
+def set_selected_features(selected_features, filepath='preprocessor.pkl'):
+    """Record the pruned model inputs in the preprocessor artifact (None = all features) if they changed"""
+    preprocessor = SpotifyDataPreprocessor()
+    preprocessor.load_preprocessor(filepath)
+    if preprocessor.selected_features != selected_features:
+        preprocessor.selected_features = selected_features
+        preprocessor.save_preprocessor(filepath)
+
+def main(parallel=True, search=False, early_stopping_rounds=None, max_bin=None, policy=None,
+         compact_thresholds='float32', distill=None, distill_depth=4, distill_augment=0,
+         select_features=None, feature_tolerance=0.01):
     """Main training pipeline"""
     print("="*60)
     print("SPOTIFY CHURN PREDICTION - MODEL TRAINING")
     print("="*60)
     
-    # Load preprocessed data
+    # Load preprocessed data (memory-mapped, read-only)
     print("\nLoading preprocessed data...")
-    X_train = pd.read_csv('X_train.csv')
-    X_test = pd.read_csv('X_test.csv')
-    y_train = pd.read_csv('y_train.csv').values.ravel()
-    y_test = pd.read_csv('y_test.csv').values.ravel()
+    X_train, X_test, y_train, y_test, feature_names = load_processed_data()
     
-    feature_names = X_train.columns.tolist()
-    
-    print(f"Training set: {X_train.shape}")
+    print(f"Training set: {X_train.shape} ({X_train.dtype})")
     print(f"Test set: {X_test.shape}")
     
     # Initialize trainer
     trainer = ChurnModelTrainer()
     
+    # Optionally prune features: rank by importance, retrain on top-k subsets and keep the smallest adequate one
+    selected_features = None
+    if select_features:
+        from feature_selection import FeatureSelector
+        selector = FeatureSelector(method=select_features, tolerance=feature_tolerance).fit(
+            X_train, y_train, feature_names
+        )
+        selector.save_results()
+        selected_features = selector.selected_features_
+        X_train = X_train[:, selector.selected_indices_]
+        X_test = X_test[:, selector.selected_indices_]
+        feature_names = selected_features
+    
+    # Optionally tune hyperparameters with cross-validated successive halving
+    model_params = None
+    if search:
+        from model_search import SuccessiveHalvingSearch
+        model_search = SuccessiveHalvingSearch(n_jobs=None if parallel else 1).fit(X_train, y_train)
+        model_search.save_results()
+        model_params = model_search.best_params_
+    
+    # XGBoost: histogram bins and validation-driven early stopping
+    if early_stopping_rounds or max_bin:
+        model_params = dict(model_params or {})
+        xgb_params = dict(model_params.get('XGBoost', {}))
+        if max_bin:
+            xgb_params['max_bin'] = max_bin
+        if early_stopping_rounds:
+            xgb_params['early_stopping_rounds'] = early_stopping_rounds
+            xgb_params['n_estimators'] = XGB_MAX_ROUNDS
+        model_params['XGBoost'] = xgb_params
+    
     # Train models
-    trainer.train_logistic_regression(X_train, y_train, X_test, y_test)
-    trainer.train_random_forest(X_train, y_train, X_test, y_test)
-    trainer.train_xgboost(X_train, y_train, X_test, y_test)
+    # Pruned matrices are passed to the workers; the full ones are memory-mapped from disk
+    trainer.train_all(X_train, y_train, X_test, y_test, parallel=parallel,
+                      data_dir=PROCESSED_DATA_DIR if selected_features is None else None, model_params=model_params)
+    if search:
+        for model_name, (cv_f1, cv_f1_std) in model_search.best_scores_.items():
+            trainer.results[model_name]['cv_f1'] = cv_f1
+            trainer.results[model_name]['cv_f1_std'] = cv_f1_std
     
-    # Get best model
-    best_name, best_result = trainer.get_best_model()
+    # Optionally distill the best model into a compact student for low-latency serving
+    if distill:
+        X_augment = synthetic_features(distill_augment, selected_features=selected_features) if distill_augment else None
+        trainer.distill(X_train, X_test, y_test, student=distill, max_depth=distill_depth, X_augment=X_augment)
+    
+    # Flat-array exports of the tree ensembles, served by the app instead of the pickles
+    trainer.export_compact(X_test, compact_thresholds)
+    
+    # Pick the deployed model before writing anything, so an unmet budget leaves the previous run's files intact
+    policy = policy or MaxF1Policy()
+    trainer.get_best_model(policy)
+    
+    # The preprocessor must produce exactly the features the models are trained on
+    set_selected_features(selected_features)
+    
+    # Reports: results summary, curve data for the app's interactive plots and the selection policy
+    trainer.summary().to_csv('model_results_summary.csv')
+    print("\nSaved: model_results_summary.csv")
+    save_evaluation_data(trainer.results, feature_names)
+    save_policy(policy)
+    
+    # Working copies of the models, read by the app where no artifact store is deployed
+    trainer.save_models()
+    
+    # Publish models, preprocessor and reports as one release and point "best" at the policy's model
+    trainer.publish_release(ArtifactStore(), policy, files=RELEASE_FILES)
+    trainer.save_best_model(policy=policy)
+    
+    best_name, best_result = trainer.get_best_model(policy)
     print("\n" + "="*60)
-    print(f"BEST MODEL: {best_name}")
+    print(f"BEST MODEL: {best_name} ({policy.describe()})")
     print("="*60)
     trainer.print_metrics(best_name, best_result['metrics'])
+    trainer.print_cost(best_result['cost'])
+    
+    print("\n[SUCCESS] Model training completed!")
+    
+    return trainer
+
+# Files published with every release, by artifact name
+RELEASE_FILES = {
+    'preprocessor': 'preprocessor.pkl',
+    'results_summary': 'model_results_summary.csv',
+    'evaluation': EVALUATION_DATA_PATH,
+    'selection_policy': SELECTION_POLICY_PATH,
+}
+
+def release_file(store, name, ref='best'):
+    """Path of an artifact of the release a store ref points to, else its working copy (RELEASE_FILES)"""
+    deployment = store.resolve(ref)
+    if deployment is not None and name in deployment[1]['artifacts']:
+        return store.object_path(deployment[1]['artifacts'][name])
+    return RELEASE_FILES[name]
+
+def update_main(data_path, n_new_trees=20, policy=None, compact_thresholds='float32'):
+    """Refresh the deployed release's models with a new data drop instead of retraining (default: its selection policy)"""
+    print("="*60)
+    print("SPOTIFY CHURN PREDICTION - MODEL UPDATE")
+    print("="*60)
+    
+    store = ArtifactStore()
+    trainer = ChurnModelTrainer()
+    trainer.load_models(store=store)
+    
+    # Encode the new rows with the models' preprocessor so features stay aligned
+    preprocessor = SpotifyDataPreprocessor()
+    preprocessor.load_preprocessor(release_file(store, 'preprocessor'))
+    X_new, y_new = preprocessor.transform(preprocessor.load_data(data_path))
+    X_new, y_new = X_new.to_numpy(dtype=np.float32), y_new.to_numpy()
+    print(f"New rows: {X_new.shape}")
+    
+    _, X_test, _, y_test, _ = load_processed_data()
+    X_test = X_test[:, preprocessor.feature_positions()]
+    trainer.update(X_new, y_new, X_test, y_test, n_new_trees=n_new_trees)
+    
+    # Models that were kept as they are carry over their fit cost and teacher fidelity from the parent release
+    parent_summary = pd.read_csv(release_file(store, 'results_summary'), index_col=0)
+    for model_name, result in trainer.results.items():
+        if model_name in MODEL_UPDATERS or model_name not in parent_summary.index:
+            continue
+        parent = parent_summary.loc[model_name].dropna()
+        result['cost'].update({column: parent[column] for column in ('fit_time_s', 'fit_cpu_s', 'peak_rss_mb')
+                               if column in parent})
+        for column in ('teacher_agreement', 'teacher_mae'):
+            if column in parent:
+                result[column] = parent[column]
+    trainer.export_compact(X_test, compact_thresholds)
     
-    # Save models
+    # Pick the deployed model before writing anything
+    policy = policy or load_policy(release_file(store, 'selection_policy'))
+    trainer.get_best_model(policy)
+    trainer.summary().to_csv('model_results_summary.csv')
+    print("\nSaved: model_results_summary.csv")
+    save_evaluation_data(trainer.results, np.asarray(preprocessor.feature_names)[preprocessor.feature_positions()])
+    save_policy(policy)
     trainer.save_models()
-    trainer.save_best_model()
-    
-    # Create visualizations
-    create_visualizations(trainer, X_test, y_test, feature_names)
-    
-    # Save results summary
-    results_summary = pd.DataFrame({
-        model_name: result['metrics']
-        for model_name, result in trainer.results.items()
-    }).T
-    results_summary = results_summary[['accuracy', 'precision', 'recall', 'f1_score', 'roc_auc']]
-    results_summary.to_csv('model_results_summary.csv')
+    trainer.publish_release(store, policy, files={**RELEASE_FILES, 'preprocessor': release_file(store, 'preprocessor')},
+                            parent=trainer.release)
+    trainer.save_best_model(policy=policy)
+    
+    print("\n[SUCCESS] Model update completed!")
+    return trainer
+
+def _subset_masks(chunk, test_size=0.2, validation_size=0.0):
+    """
+    Row masks of the 'train', 'validation' and 'test' subsets of a raw
+    chunk. Rows are assigned by fingerprint, as in the incremental
+    preprocessing split, so every pass sees the same rows.
+    """
+    bucket = row_fingerprints(chunk) % np.uint64(1000)
+    is_test = bucket < int(test_size * 1000)
+    is_validation = ~is_test & (bucket < int((test_size + validation_size) * 1000))
+    return {'train': ~is_test & ~is_validation, 'validation': is_validation, 'test': is_test}
+
+def _subset_chunks(preprocessor, data_path, chunksize, subset, test_size=0.2, validation_size=0.0):
+    """Encoded float32 (X, y) chunks of one subset ('train', 'validation' or 'test') of a data file"""
+    for chunk in iter_data_chunks(data_path, chunksize):
+        mask = _subset_masks(chunk, test_size, validation_size)[subset]
+        if mask.any():
+            X_chunk, y_chunk = preprocessor.transform(chunk[mask])
+            yield X_chunk.to_numpy(dtype=np.float32), y_chunk.to_numpy(dtype=np.float32)
+
+def external_main(data_path, chunksize=100_000, early_stopping_rounds=None, max_bin=None, policy=None,
+                  compact_thresholds='float32', cache_dir=None):
+    """Train XGBoost on a data file larger than memory, streamed in chunks through an external-memory DMatrix"""
+    print("="*60)
+    print("SPOTIFY CHURN PREDICTION - OUT-OF-CORE XGBOOST TRAINING")
+    print("="*60)
+    
+    # Fit the preprocessor on the non-test rows in one streaming pass; xgboost's passes then encode chunk by chunk
+    preprocessor = SpotifyDataPreprocessor()
+    for chunk in iter_data_chunks(data_path, chunksize):
+        is_test = _subset_masks(chunk)['test']
+        if not is_test.all():
+            preprocessor.partial_fit(chunk[~is_test])
+    preprocessor.finalize_fit()
+    
+    xgb_params = {}
+    if max_bin:
+        xgb_params['max_bin'] = max_bin
+    if early_stopping_rounds:
+        xgb_params['early_stopping_rounds'] = early_stopping_rounds
+        xgb_params['n_estimators'] = XGB_MAX_ROUNDS
+    validation_size = 0.1 if early_stopping_rounds else 0.0
+    
+    def chunk_source(subset):
+        return lambda: _subset_chunks(preprocessor, data_path, chunksize, subset, validation_size=validation_size)
+    
+    trainer = ChurnModelTrainer()
+    trainer.train_xgboost_external(chunk_source('train'), chunk_source('test'), params=xgb_params,
+                                   validation_chunk_source=chunk_source('validation'), cache_dir=cache_dir)
+    X_sample, _ = next(chunk_source('test')())
+    trainer.export_compact(X_sample, compact_thresholds)
+    
+    # Pick the deployed model before writing anything
+    policy = policy or MaxF1Policy()
+    trainer.get_best_model(policy)
+    preprocessor.save_preprocessor('preprocessor.pkl')
+    trainer.summary().to_csv('model_results_summary.csv')
     print("\nSaved: model_results_summary.csv")
+    save_evaluation_data(trainer.results, preprocessor.feature_names)
+    save_policy(policy)
+    trainer.save_models()
+    trainer.publish_release(ArtifactStore(), policy, files=RELEASE_FILES)
+    trainer.save_best_model(policy=policy)
     
-    print("\n[SUCCESS] Model training completed!")
+    print("\n[SUCCESS] Out-of-core training completed!")
+    return trainer
+
+def evaluate_main(data_path, chunksize=100_000):
+    """Stream a (large) labeled data file through the saved preprocessor and evaluate the saved models"""
+    print("="*60)
+    print("SPOTIFY CHURN PREDICTION - MODEL EVALUATION")
+    print("="*60)
     
+    store = ArtifactStore()
+    trainer = ChurnModelTrainer()
+    trainer.load_models(store=store)
+    
+    preprocessor = SpotifyDataPreprocessor()
+    preprocessor.load_preprocessor(release_file(store, 'preprocessor'))
+    
+    def chunks():
+        for chunk in iter_data_chunks(data_path, chunksize):
+            X_chunk, y_chunk = preprocessor.transform(chunk)
+            yield X_chunk.to_numpy(dtype=np.float32), y_chunk.to_numpy()
+    
+    trainer.evaluate_chunks(chunks())
+    for model_name, result in trainer.results.items():
+        trainer.print_metrics(model_name, result['metrics'])
+    
+    print("\n[SUCCESS] Model evaluation completed!")
     return trainer
 
 if __name__ == '__main__':
-    trainer = main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Train and evaluate Spotify churn prediction models')
+    parser.add_argument('--sequential', action='store_true',
+                        help='Train the models one after another instead of in parallel worker processes')
+    parser.add_argument('--search', action='store_true',
+                        help='Tune hyperparameters with cross-validated successive halving before training')
+    parser.add_argument('--early-stopping', type=int, default=None, metavar='ROUNDS',
+                        help=f'Stop XGBoost (up to {XGB_MAX_ROUNDS} trees) after ROUNDS rounds without validation improvement')
+    parser.add_argument('--max-bin', type=int, default=None,
+                        help='Histogram bins per feature for XGBoost (default 256)')
+    parser.add_argument('--update', default=None, metavar='DATA_FILE',
+                        help='Refresh the saved models with a new data drop (warm start) instead of retraining')
+    parser.add_argument('--update-trees', type=int, default=20,
+                        help='Trees added to Random Forest and XGBoost per update')
+    parser.add_argument('--evaluate', default=None, metavar='DATA_FILE',
+                        help='Evaluate the saved models on a labeled data file, streamed in chunks')
+    parser.add_argument('--external-memory', default=None, metavar='DATA_FILE',
+                        help='Train XGBoost out of core on a data file larger than memory, streamed in chunks')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory for the external-memory cache pages of --external-memory (default: system temp)')
+    parser.add_argument('--chunksize', type=int, default=100_000,
+                        help='Rows per chunk for --evaluate and --external-memory')
+    parser.add_argument('--max-p99-ms', type=float, default=None,
+                        help='Deploy the best model whose single-row p99 latency is within this budget')
+    parser.add_argument('--max-rss-mb', type=float, default=None,
+                        help='Deploy the best model whose peak training RSS is within this budget')
+    parser.add_argument('--max-size-kb', type=float, default=None,
+                        help='Deploy the best model whose serialized size is within this budget')
+    parser.add_argument('--f1-tolerance', type=float, default=None,
+                        help='Deploy the lowest-latency Pareto-optimal model within this F1 of the best')
+    parser.add_argument('--distill', choices=list(STUDENT_MODELS), default=None,
+                        help='Distill the best model into a shallow tree or logistic student for low-latency serving')
+    parser.add_argument('--distill-depth', type=int, default=4,
+                        help='Maximum depth of a --distill tree student')
+    parser.add_argument('--distill-augment', type=int, default=0, metavar='ROWS',
+                        help='Synthetic survey rows added to the distillation transfer set')
+    parser.add_argument('--select-features', choices=['permutation', 'model'], default=None,
+                        help='Prune features ranked by permutation or model importance before training')
+    parser.add_argument('--feature-tolerance', type=float, default=0.01,
+                        help='Keep the fewest top-ranked features whose validation F1 is within this of all features')
+    parser.add_argument('--compact-thresholds', choices=THRESHOLD_DTYPES, default='float32',
+                        help='Threshold storage of the compact tree-ensemble exports (float32 is exact)')
+    args = parser.parse_args()
+    
+    budgets = (args.max_p99_ms, args.max_rss_mb, args.max_size_kb)
+    if args.f1_tolerance is not None and any(b is not None for b in budgets):
+        parser.error('--f1-tolerance cannot be combined with --max-* budgets')
+    if args.f1_tolerance is not None:
+        policy = ParetoPolicy(tolerance=args.f1_tolerance)
+    elif any(b is not None for b in budgets):
+        policy = BudgetPolicy(*budgets)
+    else:
+        policy = None
+    
+    try:
+        if args.evaluate:
+            trainer = evaluate_main(args.evaluate, chunksize=args.chunksize)
+        elif args.external_memory:
+            trainer = external_main(args.external_memory, chunksize=args.chunksize,
+                                    early_stopping_rounds=args.early_stopping, max_bin=args.max_bin, policy=policy,
+                                    compact_thresholds=args.compact_thresholds, cache_dir=args.cache_dir)
+        elif args.update:
+            trainer = update_main(args.update, n_new_trees=args.update_trees, policy=policy,
+                                  compact_thresholds=args.compact_thresholds)
+        else:
+            trainer = main(parallel=not args.sequential, search=args.search,
+                           early_stopping_rounds=args.early_stopping, max_bin=args.max_bin, policy=policy,
+                           compact_thresholds=args.compact_thresholds, distill=args.distill,
+                           distill_depth=args.distill_depth, distill_augment=args.distill_augment,
+                           select_features=args.select_features, feature_tolerance=args.feature_tolerance)
+    except NoFeasibleModelError as e:
+        print(f"\n[ERROR] {e}; the deployed model and its files are unchanged")
+        sys.exit(1)
 